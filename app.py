@@ -1,14 +1,33 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, g, url_for, redirect
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, g, url_for, redirect, make_response
 from flask_wtf.csrf import CSRFProtect
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SignallingSession
 from flask_babel import Babel, gettext as _
 from flask_migrate import Migrate
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
+import logging
 import os
+import secrets
+import threading
+import time
 import uuid
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from translations import INGREDIENT_TRANSLATIONS, REVERSE_TRANSLATIONS
+import numpy as np
+from translations import translate_ingredient
+from search_index import CategoryIndex, IngredientIndex
+from scoring import DEFAULT_WEIGHTS, RelevanceModel
+from ingredient_parser import ingredient_row_mappings, normalize_name
+import http_cache
+from search_cache import SearchCache
+from recipe_cache import RecipeCache, RecipeView
+from schema import CONTENT_FIELDS, content_hash, title_sort_key, upgrade_schema
+from pagination import keyset_page, list_page
+from db_config import RoutingSQLAlchemy, engine_options
+import fulltext
+from logging_config import configure_logging
 
 # Load environment variables from .env file
 load_dotenv()
@@ -50,24 +69,53 @@ def get_recipe_emoji(recipe_title):
 app = Flask(__name__, template_folder='templates', static_folder='static', static_url_path='/static')
 app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change this to a secure secret key
 
+# Structured logging with a per-request id; see logging_config.py for the settings
+logger = configure_logging(app)
+
 # Database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///instance/recipes.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'connect_args': {'timeout': 30}  # Increased timeout for database connections
-}
+# Connection pool and SQLite pragmas (WAL, busy timeout, ...); see db_config.py
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# How often each worker checks the catalog version for changes made by other processes
+app.config['CATALOG_POLL_SECONDS'] = float(os.environ.get('CATALOG_POLL_SECONDS', 2))
+# Catalog versions kept in the change log; a worker further behind rebuilds its indexes
+app.config['CATALOG_CHANGE_RETENTION'] = int(os.environ.get('CATALOG_CHANGE_RETENTION', 10000))
+# Default and maximum number of results returned by /api/recipes
+app.config['SEARCH_PAGE_SIZE'] = 20
+app.config['SEARCH_MAX_PAGE_SIZE'] = 100
+# How long a stored search result list stays available to /results/<token>
+app.config['SEARCH_SESSION_TTL'] = int(os.environ.get('SEARCH_SESSION_TTL', 3600))
+# Best results kept in a stored search list; /results/<token> notes when there were more
+app.config['SEARCH_SESSION_DEPTH'] = int(os.environ.get('SEARCH_SESSION_DEPTH', 500))
+# How long browsers and shared caches may reuse a /api/recipes response
+app.config['SEARCH_CACHE_SECONDS'] = int(os.environ.get('SEARCH_CACHE_SECONDS', 60))
+# Server-side cache of ranked results; set SEARCH_CACHE_REDIS_URL to share it between workers
+app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
+app.config['SEARCH_CACHE_DEPTH'] = 500  # ranked results kept per cached search
+app.config['SEARCH_CACHE_REDIS_URL'] = os.environ.get('SEARCH_CACHE_REDIS_URL')
+# Time one search word may spend on typo correction against the ingredient vocabulary
+app.config['SEARCH_FUZZY_BUDGET_MS'] = float(os.environ.get('SEARCH_FUZZY_BUDGET_MS', 5))
+# Relevance weights of search results (see scoring.py); set a weight to 0 to turn its boost off
+app.config['SEARCH_SCORE_WEIGHTS'] = dict(DEFAULT_WEIGHTS)
+# How often each worker re-reads favorite counts for the popularity boost
+app.config['SEARCH_POPULARITY_REFRESH_SECONDS'] = int(os.environ.get('SEARCH_POPULARITY_REFRESH_SECONDS', 600))
+# Recipes whose decoded ingredients and instructions each worker keeps in memory
+app.config['RECIPE_CACHE_SIZE'] = int(os.environ.get('RECIPE_CACHE_SIZE', 4096))
+# Largest number of missing ingredients /api/pantry accepts
+app.config['PANTRY_MAX_MISSING'] = 5
+# Most favorite ids accepted by one /api/favorites/batch request
+app.config['FAVORITES_BATCH_MAX'] = 1000
+# Whether ricettario text searches without FTS5 show a result count (one cached COUNT per query and catalog version)
+app.config['RICETTARIO_COUNT_SEARCHES'] = os.environ.get('RICETTARIO_COUNT_SEARCHES', '1') != '0'
 
 # Initialize extensions
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+db.init_engines(app)
 csrf = CSRFProtect(app)
 babel = Babel(app)
 migrate = Migrate(app, db)
 
-# Initialize database tables on startup
-with app.app_context():
-    db.create_all()
-    print("Database tables initialized on startup")
-
 # Add template globals
 app.jinja_env.globals['get_recipe_emoji'] = get_recipe_emoji
 app.jinja_env.globals['min'] = min  # Add Python's min function to Jinja environment
@@ -75,27 +123,25 @@ app.jinja_env.globals['min'] = min  # Add Python's min function to Jinja environ
 # Babel configuration
 app.config['BABEL_DEFAULT_LOCALE'] = 'en'
 app.config['BABEL_TRANSLATION_DIRECTORIES'] = 'translations'
+# Changes whenever templates, translations or static files are deployed; part of the HTML ETags
+app.config['BUILD_TOKEN'] = http_cache.build_token(
+    os.path.join(app.root_path, app.template_folder),
+    os.path.join(app.root_path, app.config['BABEL_TRANSLATION_DIRECTORIES']),
+    app.static_folder
+)
 app.config['LANGUAGES'] = {
     'en': 'English',
     'it': 'Italiano'
 }
 
-def translate_ingredient(ingredient, target_lang='en'):
-    """Translate an ingredient to or from English"""
-    ingredient = ingredient.lower().strip()
-    if target_lang == 'en':
-        # Italian to English
-        return REVERSE_TRANSLATIONS.get(ingredient, ingredient)
-    else:
-        # English to Italian
-        return INGREDIENT_TRANSLATIONS.get(ingredient, ingredient)
-
 @babel.localeselector
 def get_locale():
     # Try to get the language from the URL parameter
     lang = request.args.get('lang')
     if lang and lang in app.config['LANGUAGES']:
-        session['lang'] = lang
+        # Only a change rewrites the session cookie
+        if session.get('lang') != lang:
+            session['lang'] = lang
         return lang
     
     # Try to get the language from the session
@@ -114,6 +160,14 @@ def before_request():
     # Set flask-babel locale for this request
     if hasattr(g, 'lang_code'):
         babel.locale_selector_func = lambda: g.lang_code
+    
+    # Pick up recipe changes made by other workers or import runs
+    if request.endpoint not in ('static', 'static_files', 'serve_static'):
+        try:
+            sync_catalog()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Error syncing catalog")
 
 # Add Jinja2 extensions
 app.jinja_env.add_extension('jinja2.ext.i18n')
@@ -143,11 +197,38 @@ class Recipe(db.Model):
     image_url = db.Column(db.String(500), nullable=True)
     source_url = db.Column(db.String(500), nullable=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Precomputed title sort keys for the ricettario listing, kept by update_sort_keys()
+    sort_key_en = db.Column(db.String(200), nullable=True)
+    sort_key_it = db.Column(db.String(200), nullable=True)
+    # Hash of the content columns (schema.content_hash): imports skip unchanged recipes by it,
+    # and it versions the decoded copies in recipe_cache
+    content_hash = db.Column(db.String(40), nullable=True)
     favorites = db.relationship('Favorite', backref='recipe', lazy=True)
+    ingredient_rows = db.relationship(
+        'RecipeIngredient', backref='recipe', lazy=True, cascade='all, delete-orphan',
+        order_by='(RecipeIngredient.lang, RecipeIngredient.position)'
+    )
+
+    __table_args__ = (
+        db.Index('ix_recipe_sort_key_en', 'sort_key_en', 'id'),
+        db.Index('ix_recipe_sort_key_it', 'sort_key_it', 'id'),
+    )
 
     def __repr__(self):
         return f'<Recipe {self.title_en}>'
 
+    def update_sort_keys(self):
+        """Recompute the per-language title sort keys (Italian falls back to the English title)."""
+        self.sort_key_en = title_sort_key(self.title_en)
+        self.sort_key_it = title_sort_key(self.title_it or self.title_en)
+
+    def build_ingredient_rows(self):
+        """Rebuild the parsed RecipeIngredient rows from the JSON ingredient columns."""
+        self.ingredient_rows = [
+            RecipeIngredient(**row)
+            for row in ingredient_row_mappings(self.ingredients_en, self.ingredients_it)
+        ]
+
     def get_image_url(self):
         """Get the image URL with robust fallback to default image"""
         # If there's no image URL at all, use default
@@ -161,15 +242,23 @@ class Recipe(db.Model):
         # Return the actual image URL directly - no URL manipulation
         return self.image_url
 
+    def decoded(self):
+        """Decoded ingredients and instructions (a RecipeView), shared through the recipe cache."""
+        if sa_inspect(self).modified:
+            # Unflushed edits: the content hash does not describe these values yet
+            return RecipeView(self)
+        return recipe_cache.view(self)
+
     def to_dict(self):
+        view = self.decoded()
         return {
             'id': self.id,
             'title_en': self.title_en,
             'title_it': self.title_it,
-            'ingredients_en': json.loads(self.ingredients_en),
-            'ingredients_it': json.loads(self.ingredients_it) if self.ingredients_it else None,
-            'instructions_en': json.loads(self.instructions_en),
-            'instructions_it': json.loads(self.instructions_it) if self.instructions_it else None,
+            'ingredients_en': list(view.ingredients_en),
+            'ingredients_it': list(view.ingredients_it) if view.ingredients_it else None,
+            'instructions_en': list(view.instructions_en),
+            'instructions_it': list(view.instructions_it) if view.instructions_it else None,
             'vegetarian': self.vegetarian,
             'vegan': self.vegan,
             'category': self.category or 'quick-meals',
@@ -186,15 +275,29 @@ class Recipe(db.Model):
 
     def get_ingredients(self, lang='en'):
         """Get the ingredients in the specified language"""
-        if lang == 'it' and self.ingredients_it:
-            return json.loads(self.ingredients_it)
-        return json.loads(self.ingredients_en)
+        return list(self.decoded().ingredients(lang))
 
     def get_instructions(self, lang='en'):
         """Get the instructions in the specified language"""
-        if lang == 'it' and self.instructions_it:
-            return json.loads(self.instructions_it)
-        return json.loads(self.instructions_en)
+        return list(self.decoded().instructions(lang))
+
+class RecipeIngredient(db.Model):
+    """One parsed ingredient line of a recipe, in one language."""
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False, index=True)
+    lang = db.Column(db.String(2), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Float, nullable=True)
+    unit = db.Column(db.String(20), nullable=True)
+    # NOCASE lets SQLite serve case-insensitive LIKE 'prefix%' from the index
+    name = db.Column(db.String(200, collation='NOCASE'), nullable=False, index=True)
+
+    def __repr__(self):
+        return '<RecipeIngredient {} {} {}>'.format(self.recipe_id, self.lang, self.name)
+
+    __table_args__ = (
+        db.Index('ix_recipe_ingredient_lang_name', 'lang', 'name'),
+    )
 
 class Favorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -207,51 +310,369 @@ class Favorite(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('recipe_id', 'session_id', name='unique_favorite'),
+        # Per-session lookups; the unique constraint's index leads with recipe_id
+        db.Index('ix_favorite_session_id', 'session_id', 'recipe_id'),
+    )
+
+class CatalogVersion(db.Model):
+    """Single row holding a counter that is bumped on every recipe write."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class CatalogChange(db.Model):
+    """Log of recipe writes, so other workers can apply only what changed."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    recipe_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # insert, update or delete
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return '<CatalogChange {} {} v{}>'.format(self.operation, self.recipe_id, self.version)
+
+class SearchSession(db.Model):
+    """Ranked result list of one search, rendered page by page by /results/<token>."""
+    token = db.Column(db.String(32), primary_key=True)
+    search_term = db.Column(db.String(500), nullable=False)
+    vegetarian = db.Column(db.Boolean, default=False)
+    # JSON object: the search terms and language, the total number of
+    # matches, and [recipe_id, score] of up to SEARCH_SESSION_DEPTH best ones
+    results = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<SearchSession {}>'.format(self.token)
+
+    def get_results(self):
+        """The stored results, or None for lists stored in the older per-result format."""
+        results = json.loads(self.results)
+        return results if isinstance(results, dict) else None
+
+# In-memory ingredient index used by the search API
+ingredient_index = IngredientIndex(fuzzy_budget=app.config['SEARCH_FUZZY_BUDGET_MS'] / 1000)
+
+# Recipe ids per catalog category, for the ricettario filters and counts
+category_index = CategoryIndex()
+
+# IDF term weights and popularity for ranking searches, refreshed with the catalog
+relevance = RelevanceModel(app.config['SEARCH_SCORE_WEIGHTS'])
+
+# Decoded ingredients and instructions of recently read recipes
+recipe_cache = RecipeCache(max_entries=app.config['RECIPE_CACHE_SIZE'])
+
+# Ranked results of recent searches, invalidated by the catalog version
+search_cache = SearchCache(
+    max_entries=app.config['SEARCH_CACHE_SIZE'],
+    redis_url=app.config['SEARCH_CACHE_REDIS_URL']
+)
+
+# Recipe fields the in-process search structures are built from
+INDEXED_FIELDS = ('id', 'vegetarian', 'vegan', 'category', 'title_it', 'ingredients_en', 'ingredients_it')
+
+# Catalog version the in-process search structures reflect
+catalog_state = {'version': 0, 'updated_at': None, 'checked_at': 0.0, 'relevance_at': 0.0}
+catalog_lock = threading.Lock()
+
+def get_catalog_version():
+    """Read the current catalog version from the database."""
+    version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar()
+    return version or 0
+
+def get_catalog_updated_at():
+    """Time of the most recent recipe write, or None if nothing was logged yet."""
+    return db.session.query(CatalogChange.created_at).order_by(CatalogChange.id.desc()).limit(1).scalar()
+
+def load_catalog_indexes():
+    """Build the ingredient index from the recipes currently in the database."""
+    # Read the version first, so changes made during the build get replayed
+    version = get_catalog_version()
+    rows = db.session.query(*[getattr(Recipe, f) for f in INDEXED_FIELDS]).all()
+    ingredient_index.build([(row.id, row.vegetarian, row.ingredients_en, row.ingredients_it) for row in rows])
+    category_index.build([(row.id, row.category, row.title_it, row.vegetarian, row.vegan) for row in rows])
+    # Changes this worker missed are not known one by one
+    recipe_cache.clear()
+    catalog_state['version'] = version
+    catalog_state['updated_at'] = get_catalog_updated_at()
+    catalog_state['checked_at'] = time.monotonic()
+    refresh_relevance()
+    logger.info("Catalog indexes built for %d recipes (catalog version %d)", len(ingredient_index), version)
+
+def refresh_relevance():
+    """Recompute the search ranking weights: term IDF from the index, popularity from favorite counts."""
+    counts = dict(db.session.query(Favorite.recipe_id, db.func.count(Favorite.id)).group_by(Favorite.recipe_id))
+    relevance.refresh(counts)
+    catalog_state['relevance_at'] = time.monotonic()
+
+def get_ingredient_index():
+    """Return the ingredient index, building it on first use if startup could not."""
+    if not ingredient_index.ready:
+        load_catalog_indexes()
+    return ingredient_index
+
+def get_category_index():
+    """Return the category index, building the catalog indexes on first use if startup could not."""
+    if not ingredient_index.ready:
+        load_catalog_indexes()
+    return category_index
+
+def apply_recipe_changes(rows, removed_ids=()):
+    """Patch the in-process search structures with changed recipe rows."""
+    for row in rows:
+        ingredient_index.add(row.id, row.vegetarian, row.ingredients_en, row.ingredients_it)
+        category_index.add(row.id, row.category, row.title_it, row.vegetarian, row.vegan)
+        # The content hash is the source record's: an update that keeps stored
+        # Italian fields can bring back an old hash for different columns
+        recipe_cache.discard(row.id)
+    for recipe_id in removed_ids:
+        ingredient_index.remove(recipe_id)
+        category_index.remove(recipe_id)
+        recipe_cache.discard(recipe_id)
+
+def sync_catalog(force=False):
+    """
+    Apply recipe changes committed by other processes (gunicorn workers,
+    import_recipes.py) since this worker last looked at the catalog version.
+    """
+    now = time.monotonic()
+    if not force and now - catalog_state['checked_at'] < app.config['CATALOG_POLL_SECONDS']:
+        return
+    with catalog_lock:
+        catalog_state['checked_at'] = now
+        if not ingredient_index.ready:
+            load_catalog_indexes()
+            return
+        version = get_catalog_version()
+        if version == catalog_state['version']:
+            # Favorites change without the catalog; pick up new counts now and then
+            if now - catalog_state['relevance_at'] >= app.config['SEARCH_POPULARITY_REFRESH_SECONDS']:
+                refresh_relevance()
+            return
+        oldest = db.session.query(db.func.min(CatalogChange.version)).scalar()
+        if oldest is None or oldest > catalog_state['version'] + 1:
+            # Some of the changes this worker missed were trimmed from the log
+            logger.info("Catalog version %d is past the change log; rebuilding the indexes",
+                        catalog_state['version'])
+            load_catalog_indexes()
+            return
+        changed_ids = [row.recipe_id for row in db.session.query(CatalogChange.recipe_id)
+                       .filter(CatalogChange.version > catalog_state['version'])
+                       .distinct()]
+        rows = []
+        for start in range(0, len(changed_ids), 500):
+            chunk = changed_ids[start:start + 500]
+            rows.extend(db.session.query(*[getattr(Recipe, f) for f in INDEXED_FIELDS])
+                        .filter(Recipe.id.in_(chunk)).all())
+        removed_ids = set(changed_ids) - {row.id for row in rows}
+        apply_recipe_changes(rows, removed_ids)
+        catalog_state['version'] = version
+        catalog_state['updated_at'] = get_catalog_updated_at()
+        refresh_relevance()
+        logger.info("Catalog synced to version %d: %d recipes changed", version, len(changed_ids))
+
+class _RecipeSnapshot:
+    """Copy of the indexed fields of a Recipe, taken while it is being flushed."""
+    __slots__ = INDEXED_FIELDS
+
+    def __init__(self, recipe):
+        for field in INDEXED_FIELDS:
+            setattr(self, field, getattr(recipe, field))
+
+def _track_recipe_change(recipe, operation):
+    session = db.object_session(recipe)
+    if session is None:
+        return
+    session.info.setdefault('catalog_unflushed', []).append((operation, recipe.id))
+    session.info.setdefault('catalog_uncommitted', []).append(
+        (operation, _RecipeSnapshot(recipe) if operation != 'delete' else recipe.id)
     )
 
+@event.listens_for(Recipe, 'before_insert')
+@event.listens_for(Recipe, 'before_update')
+def recipe_before_write(mapper, connection, target):
+    target.update_sort_keys()
+    # A hash set explicitly (the importer's hash of the source record) is kept
+    if not sa_inspect(target).attrs.content_hash.history.has_changes():
+        target.content_hash = content_hash({field: getattr(target, field) for field in CONTENT_FIELDS})
+
+@event.listens_for(Recipe, 'after_insert')
+def recipe_after_insert(mapper, connection, target):
+    _track_recipe_change(target, 'insert')
+
+@event.listens_for(Recipe, 'after_update')
+def recipe_after_update(mapper, connection, target):
+    # after_update also fires for dirty objects without net column changes
+    state = sa_inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        _track_recipe_change(target, 'update')
+
+@event.listens_for(Recipe, 'after_delete')
+def recipe_after_delete(mapper, connection, target):
+    _track_recipe_change(target, 'delete')
+
+def record_catalog_changes(connection, changes):
+    """
+    Bump the catalog version once and log the (operation, recipe_id) changes
+    under it, dropping the changes of versions older than the last
+    CATALOG_CHANGE_RETENTION. Runs inside the caller's transaction.
+    """
+    if not changes:
+        return None
+    result = connection.execute(
+        CatalogVersion.__table__.update()
+        .where(CatalogVersion.id == 1)
+        .values(version=CatalogVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(CatalogVersion.__table__.insert().values(id=1, version=1))
+    version = connection.execute(
+        db.select([CatalogVersion.version]).where(CatalogVersion.id == 1)
+    ).scalar()
+    connection.execute(
+        CatalogChange.__table__.insert(),
+        [{'version': version, 'recipe_id': recipe_id, 'operation': operation}
+         for operation, recipe_id in changes]
+    )
+    retention = app.config['CATALOG_CHANGE_RETENTION']
+    if version > retention:
+        connection.execute(
+            CatalogChange.__table__.delete().where(CatalogChange.version <= version - retention)
+        )
+    return version
+
+@event.listens_for(SignallingSession, 'after_flush')
+def catalog_after_flush(session, flush_context):
+    changes = session.info.pop('catalog_unflushed', None)
+    if changes:
+        version = record_catalog_changes(session.connection(), changes)
+        # Versions written by this transaction, so the commit can adopt them
+        session.info.setdefault('catalog_first_version', version)
+        session.info['catalog_last_version'] = version
+
+@event.listens_for(SignallingSession, 'after_commit')
+def catalog_after_commit(session):
+    changes = session.info.pop('catalog_uncommitted', None)
+    first_version = session.info.pop('catalog_first_version', None)
+    last_version = session.info.pop('catalog_last_version', None)
+    if not changes:
+        return
+    # Patch this process right away; other processes pick it up in sync_catalog
+    rows = [snapshot for operation, snapshot in changes if operation != 'delete']
+    removed_ids = [recipe_id for operation, recipe_id in changes if operation == 'delete']
+    with catalog_lock:
+        if ingredient_index.ready:
+            apply_recipe_changes(rows, removed_ids)
+            if last_version is not None and first_version == catalog_state['version'] + 1:
+                # Nothing from other processes in between: this worker is now current,
+                # so cached searches and ETags of the old version stop being served
+                catalog_state['version'] = last_version
+                catalog_state['updated_at'] = datetime.utcnow().replace(microsecond=0)
+            else:
+                # Other writers' changes are pending: sync on the next request
+                catalog_state['checked_at'] = 0.0
+
+@event.listens_for(SignallingSession, 'after_rollback')
+def catalog_after_rollback(session):
+    session.info.pop('catalog_unflushed', None)
+    session.info.pop('catalog_uncommitted', None)
+    session.info.pop('catalog_first_version', None)
+    session.info.pop('catalog_last_version', None)
+
+# Initialize database tables on startup. The catalog indexes are built by the
+# first request (sync_catalog), so scripts importing the app don't pay for them
+with app.app_context():
+    try:
+        db.create_all()
+        backfilled = upgrade_schema(db.engine)
+        fulltext.setup_fulltext(db.engine)
+        logger.info("Database tables initialized on startup (%d recipes backfilled)", backfilled)
+    except Exception as e:
+        logger.warning("Database not initialized on startup: %s", e)
+
 # Create database tables
 def init_db():
     try:
-        print("Checking database...")
+        logger.info("Checking database...")
         with app.app_context():
             # Create tables if they don't exist
             db.create_all()
-            print("Database tables verified.")
+            upgrade_schema(db.engine)
+            fulltext.setup_fulltext(db.engine)
+            logger.info("Database tables verified.")
             
             # Check if we have any recipes
             recipe_count = Recipe.query.count()
-            print(f"Found {recipe_count} recipes in the database.")
+            logger.info("Found %d recipes in the database.", recipe_count)
             
-            if recipe_count == 0:
-                print("No recipes found. Importing recipes from recipes.json...")
-                # Run the import_recipes.py script as a separate process to avoid circular imports
-                import subprocess
-                import sys
-                try:
-                    subprocess.run([sys.executable, 'import_recipes.py'])
-                except Exception as e:
-                    print(f"Error importing recipes: {str(e)}")
+            # Recipes whose content hash is unchanged are skipped, so this only
+            # writes what changed in recipes.json since the last run
+            logger.info("Syncing recipes from recipes.json...")
+            # Run the import_recipes.py script as a separate process to avoid circular imports
+            import subprocess
+            import sys
+            try:
+                subprocess.run([sys.executable, 'import_recipes.py', '--bulk'])
+            except Exception as e:
+                logger.exception("Error importing recipes")
     except Exception as e:
-        print(f"Error checking database: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error checking database")
         
         # Attempt to create instance directory if it doesn't exist
         import os
         os.makedirs('instance', exist_ok=True)
         
         try:
-            print("Retrying database initialization...")
+            logger.info("Retrying database initialization...")
             with app.app_context():
                 db.create_all()
-                print("Database tables created successfully after retry.")
+                logger.info("Database tables created successfully after retry.")
         except Exception as retry_error:
-            print(f"Failed to initialize database after retry: {str(retry_error)}")
+            logger.error("Failed to initialize database after retry: %s", retry_error)
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/results/<token>')
+def search_results(token):
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = app.config['SEARCH_PAGE_SIZE']
+    lang = g.get('lang_code', 'en')
+    
+    search = SearchSession.query.get(token)
+    stored = search.get_results() if search is not None and search.expires_at >= datetime.utcnow() else None
+    if stored is None:
+        return render_template('results.html', recipes=[], search_term='', expired=True)
+    
+    all_ranked = stored['ranked']
+    pages = max(1, (len(all_ranked) + per_page - 1) // per_page)
+    if page > pages:
+        return redirect(url_for('search_results', token=token, page=pages))
+    ranked = all_ranked[(page - 1) * per_page:page * per_page]
+    
+    favorites = get_favorite_ids(get_session_id())
+    recipes = {recipe.id: recipe for recipe in load_recipes(recipe_id for recipe_id, _ in ranked)}
+    terms = stored['terms']
+    details = match_details(terms, stored['lang'], search.vegetarian, recipes)
+    recipes_data = [
+        build_recipe_result(recipes[recipe_id], *details.get(recipe_id, (0.0, terms)),
+                            favorites=favorites, lang=lang, score=score)
+        for recipe_id, score in ranked
+        if recipe_id in recipes
+    ]
+    
+    return render_template(
+        'results.html',
+        recipes=recipes_data,
+        search_term=search.search_term,
+        vegetarian_only=search.vegetarian,
+        token=token,
+        current_page=page,
+        total_pages=pages,
+        total_results=stored['total'],
+        shown_results=len(all_ranked)
+    )
+
 @app.route('/results')
 def results():
     data = request.args.get('data')
@@ -270,16 +691,165 @@ def serve_static(path):
         return send_from_directory(app.static_folder, path)
     return send_from_directory(app.template_folder, 'index.html')
 
+def load_recipes(recipe_ids, chunk_size=500):
+    """Load recipes by id, in chunks to stay under SQLite's bound parameter limit."""
+    recipe_ids = list(recipe_ids)
+    recipes = []
+    for start in range(0, len(recipe_ids), chunk_size):
+        chunk = recipe_ids[start:start + chunk_size]
+        recipes.extend(Recipe.query.filter(Recipe.id.in_(chunk)).all())
+    return recipes
+
+def search_key(ingredients, vegetarian, lang):
+    """Normalized identity of a search: sorted, deduplicated English terms, flag and language."""
+    return (tuple(sorted(set(ingredients))), bool(vegetarian), lang or 'en')
+
+def rank_recipes(ingredients, lang='en', vegetarian=False, limit=None, favorites=()):
+    """
+    Rank recipes by relevance to the (English) search ingredients, see scoring.py.
+    Returns (total, ranked) where ranked holds up to limit
+    (recipe_id, match_percentage, missing_ingredients, score) tuples, best
+    first and by id among equal scores. Only the index is used, no recipe rows
+    are loaded.
+    """
+    index = get_ingredient_index()
+    result = index.score(ingredients, lang, vegetarian_only=vegetarian)
+    total = len(result)
+    if not total:
+        return 0, []
+    scores = relevance.score(index, ingredients, lang, result, favorites).total
+    if limit is not None and limit < total:
+        # Everything scoring at least the limit-th best score, ties included
+        threshold = np.partition(-scores, limit - 1)[limit - 1]
+        candidates = np.flatnonzero(-scores <= threshold)
+    else:
+        candidates = np.arange(total)
+    top = candidates[np.lexsort((result.ids[candidates], -scores[candidates]))][:limit]
+    percentages = result.counts / len(ingredients) * 100
+    ranked = []
+    for i in top.tolist():
+        missing_ingredients = [ing for ing, hit in zip(ingredients, result.matched[i].tolist()) if not hit]
+        ranked.append((int(result.ids[i]), float(percentages[i]), missing_ingredients, round(float(scores[i]), 4)))
+    return total, ranked
+
+def explain_scores(ingredients, lang, vegetarian, recipe_ids, favorites=()):
+    """{recipe_id: score breakdown} for some of the results of a search."""
+    terms = list(search_key(ingredients, vegetarian, lang)[0])
+    index = get_ingredient_index()
+    result = index.score(terms, lang, vegetarian_only=vegetarian)
+    scores = relevance.score(index, terms, lang, result, favorites)
+    wanted = set(recipe_ids)
+    return {int(recipe_id): scores.breakdown(i) for i, recipe_id in enumerate(result.ids.tolist()) if recipe_id in wanted}
+
+def match_details(terms, lang, vegetarian, recipe_ids):
+    """{recipe_id: (match_percentage, missing_ingredients)} of some of the results of a search."""
+    result = get_ingredient_index().score(terms, lang, vegetarian_only=vegetarian)
+    positions = np.flatnonzero(np.isin(result.ids, np.fromiter(recipe_ids, dtype=np.int64)))
+    percentages = result.counts / len(terms) * 100
+    return {
+        int(result.ids[i]): (float(percentages[i]),
+                             [term for term, hit in zip(terms, result.matched[i].tolist()) if not hit])
+        for i in positions.tolist()
+    }
+
+def boost_favorites(ranked, favorites, weight):
+    """Add the favorite boost to the searcher's favorites in a ranked list and sort it again."""
+    boosted = [
+        (recipe_id, match_percentage, missing_ingredients,
+         round(score + weight, 4) if recipe_id in favorites else score)
+        for recipe_id, match_percentage, missing_ingredients, score in ranked
+    ]
+    boosted.sort(key=lambda result: (-result[3], result[0]))
+    return boosted
+
+def get_ranked_recipes(ingredients, lang='en', vegetarian=False, limit=None, favorites=()):
+    """
+    rank_recipes behind the search cache. Searches are keyed on their
+    normalized form, so "pasta, eggs" and "Eggs,pasta" share an entry.
+    The cache holds the ranking without favorites; a searcher's favorites
+    are boosted by reranking the cached list, so favorites ranked below the
+    cached depth are not pulled up.
+    """
+    key = search_key(ingredients, vegetarian, lang)
+    terms = list(key[0])
+    weight = relevance.weights['favorite'] if favorites else 0
+    # Rankings change with the catalog and with the relevance weights
+    version = '{}.{}'.format(catalog_state['version'], relevance.fingerprint)
+    depth = app.config['SEARCH_CACHE_DEPTH']
+    cached = search_cache.get(key, version)
+    if cached is not None and (cached[0] == len(cached[1]) or (limit is not None and limit <= len(cached[1]))):
+        # Entries hold at most `depth` results; deeper requests go to the index
+        total, ranked = cached
+    elif limit is not None and limit > depth:
+        return rank_recipes(terms, lang, vegetarian, limit=limit, favorites=favorites)
+    else:
+        total, ranked = rank_recipes(terms, lang, vegetarian, limit=None if limit is None else depth)
+        search_cache.set(key, version, (total, ranked[:depth]))
+    if weight:
+        ranked = boost_favorites(ranked, favorites, weight)
+    return total, ranked[:limit]
+
+def build_recipe_result(recipe, match_percentage, missing_ingredients, favorites, lang='en', score=None):
+    """Full search result payload for one recipe."""
+    if lang == 'it':
+        missing_ingredients = [translate_ingredient(ing, 'it') for ing in missing_ingredients]
+    
+    recipe_dict = recipe.to_dict()
+    recipe_dict['title'] = recipe.get_title(lang)
+    recipe_dict['match_percentage'] = match_percentage
+    if score is not None:
+        recipe_dict['score'] = score
+    recipe_dict['missing_ingredients'] = missing_ingredients
+    recipe_dict['emoji'] = get_recipe_emoji(recipe.title_en)
+    recipe_dict['is_favorite'] = recipe.id in favorites
+    
+    # Use the correct language version for ingredients and instructions
+    if lang == 'it' and recipe.ingredients_it:
+        recipe_dict['ingredients'] = recipe_dict['ingredients_it']
+        recipe_dict['instructions'] = recipe_dict['instructions_it'] or recipe_dict['instructions_en']
+    else:
+        recipe_dict['ingredients'] = recipe_dict['ingredients_en']
+        recipe_dict['instructions'] = recipe_dict['instructions_en']
+    return recipe_dict
+
+def create_search_session(search_term, terms, lang, vegetarian, total, ranked):
+    """
+    Store the ids and scores of a ranked result list under a new token and
+    drop expired ones. Match percentages and missing ingredients are worked
+    out again from the terms when a page is shown.
+    """
+    now = datetime.utcnow()
+    SearchSession.query.filter(SearchSession.expires_at < now).delete(synchronize_session=False)
+    results = {
+        'terms': terms,
+        'lang': lang,
+        'total': total,
+        'ranked': [[recipe_id, score] for recipe_id, _, _, score in ranked],
+    }
+    search = SearchSession(
+        token=secrets.token_urlsafe(8),
+        search_term=search_term[:500],
+        vegetarian=vegetarian,
+        results=json.dumps(results, separators=(',', ':')),
+        expires_at=now + timedelta(seconds=app.config['SEARCH_SESSION_TTL'])
+    )
+    db.session.add(search)
+    db.session.commit()
+    return search.token
+
 @app.route('/api/recipes')
 def get_recipes():
     # Get query parameters
     ingredients = request.args.get('ingredients', '').lower().split(',')
     ingredients = [i.strip() for i in ingredients if i.strip()]
     vegetarian = request.args.get('vegetarian', '').lower() == 'true'
+    explain = request.args.get('explain', '').lower() == 'true'
+    limit = request.args.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['SEARCH_MAX_PAGE_SIZE']))
+    offset = max(0, request.args.get('offset', 0, type=int))
     session_id = get_session_id()
     
-    print(f"Searching for recipes with ingredients: {ingredients}")
-    print(f"Current language: {g.lang_code}")
+    logger.debug("Searching for recipes with ingredients %s (lang=%s)", ingredients, g.lang_code)
     
     if not ingredients:
         return jsonify({'error': 'No ingredients provided'}), 400
@@ -287,82 +857,138 @@ def get_recipes():
     try:
         # Translate ingredients to English if in Italian
         if g.lang_code == 'it':
-            print("Translating search ingredients to English")
             ingredients = [translate_ingredient(ing, 'en') for ing in ingredients]
-            print(f"Translated ingredients: {ingredients}")
+            logger.debug("Translated ingredients: %s", ingredients)
         
-        # Start with base query
-        query = Recipe.query
+        # Get user's favorites; they boost the ranking and are marked in the results
+        favorites = get_favorite_ids(session_id)
         
-        # Apply vegetarian filter if requested
-        if vegetarian:
-            query = query.filter_by(vegetarian=True)
+        if request.args.get('session', '').lower() == 'true':
+            # Store the best ids and hand back a short token for /results/<token>
+            total, ranked = get_ranked_recipes(ingredients, g.lang_code, vegetarian,
+                                               limit=app.config['SEARCH_SESSION_DEPTH'], favorites=favorites)
+            logger.debug("Found %d matching recipes", total)
+            if not total:
+                return jsonify({'error': 'No matching recipes found'}), 404
+            terms = list(search_key(ingredients, vegetarian, g.lang_code)[0])
+            token = create_search_session(request.args.get('ingredients', ''), terms, g.lang_code,
+                                          vegetarian, total, ranked)
+            return jsonify({
+                'token': token,
+                'total': total,
+                'results_url': url_for('search_results', token=token)
+            })
         
-        # Get all matching recipes
-        recipes = query.all()
-        matching_recipes = []
+        # Same normalized search on the same catalog gives the same body
+        etag = http_cache.make_etag(
+            'api', search_key(ingredients, vegetarian, g.lang_code), limit, offset, explain,
+            catalog_state['version'], relevance.fingerprint, sorted(favorites)
+        )
+        # Answers with favorites in them are per user; others can be shared
+        # when the language comes from the URL rather than the session, unless
+        # this request also sets the session cookie (?lang= stores the language)
+        if favorites or 'lang' not in request.args or session.modified:
+            cache_control = 'private, max-age={}'.format(app.config['SEARCH_CACHE_SECONDS'])
+        else:
+            cache_control = 'public, max-age={}'.format(app.config['SEARCH_CACHE_SECONDS'])
+        if http_cache.is_not_modified(etag):
+            return http_cache.not_modified(etag, cache_control=cache_control)
         
-        # Get user's favorites
-        favorites = {f.recipe_id for f in Favorite.query.filter_by(session_id=session_id).all()}
+        # Rank on the index alone and keep only the requested page
+        total, ranked = get_ranked_recipes(ingredients, g.lang_code, vegetarian, limit=offset + limit, favorites=favorites)
+        ranked = ranked[offset:]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Recipe search", extra={
+                'ingredients': len(ingredients), 'lang': g.lang_code, 'total': total,
+                'returned': len(ranked), 'offset': offset
+            })
         
-        for recipe in recipes:
-            print(f"\nProcessing recipe: {recipe.get_title(g.lang_code)}")
-            recipe_ingredients = recipe.get_ingredients(g.lang_code)
-            recipe_instructions = recipe.get_instructions(g.lang_code)
-            
-            print(f"Search ingredients: {ingredients}")
-            print(f"Recipe ingredients: {recipe_ingredients}")
-            
-            recipe_ingredients_lower = [ing.lower() for ing in recipe_ingredients]
-            
-            # Count matching ingredients with more flexible matching
-            matching_count = sum(1 for ing in ingredients 
-                               if any(ing in ri.lower() or ri.lower() in ing for ri in recipe_ingredients_lower))
-            
-            print(f"Matching count: {matching_count}")
-            
-            if matching_count > 0:
-                # Calculate match percentage
-                match_percentage = (matching_count / len(ingredients)) * 100
-                
-                # Find missing ingredients and translate them if needed
-                missing_ingredients = [
-                    ing for ing in ingredients 
-                    if not any(ing in ri.lower() or ri.lower() in ing for ri in recipe_ingredients_lower)
-                ]
-                
-                if g.lang_code == 'it':
-                    missing_ingredients = [translate_ingredient(ing, 'it') for ing in missing_ingredients]
-                
-                recipe_dict = recipe.to_dict()
-                recipe_dict['title'] = recipe.get_title(g.lang_code)
-                recipe_dict['match_percentage'] = match_percentage
-                recipe_dict['missing_ingredients'] = missing_ingredients
-                recipe_dict['emoji'] = get_recipe_emoji(recipe.title_en)
-                recipe_dict['is_favorite'] = recipe.id in favorites
-                
-                # Use the correct language version for ingredients and instructions
-                if g.lang_code == 'it' and recipe.ingredients_it:
-                    recipe_dict['ingredients'] = json.loads(recipe.ingredients_it)
-                    recipe_dict['instructions'] = json.loads(recipe.instructions_it) if recipe.instructions_it else recipe_instructions
-                else:
-                    recipe_dict['ingredients'] = json.loads(recipe.ingredients_en)
-                    recipe_dict['instructions'] = json.loads(recipe.instructions_en)
-                
-                matching_recipes.append(recipe_dict)
+        if not total:
+            return jsonify({'error': 'No matching recipes found'}), 404
         
-        # Sort by match percentage
-        matching_recipes.sort(key=lambda x: x['match_percentage'], reverse=True)
+        # Only the returned recipes are loaded and serialized
+        recipes = {recipe.id: recipe for recipe in load_recipes(row[0] for row in ranked)}
+        matching_recipes = [
+            build_recipe_result(recipes[recipe_id], match_percentage, missing_ingredients, favorites, g.lang_code, score)
+            for recipe_id, match_percentage, missing_ingredients, score in ranked
+            if recipe_id in recipes
+        ]
+        if explain:
+            breakdowns = explain_scores(ingredients, g.lang_code, vegetarian, recipes, favorites)
+            for recipe_dict in matching_recipes:
+                recipe_dict['score_breakdown'] = breakdowns.get(recipe_dict['id'])
         
-        if not matching_recipes:
+        response = jsonify(matching_recipes)
+        response.headers['X-Total-Count'] = str(total)
+        if offset + limit < total:
+            response.headers['X-Next-Offset'] = str(offset + limit)
+        return http_cache.set_validators(response, etag, cache_control=cache_control)
+        
+    except Exception as e:
+        logger.exception("Error in get_recipes")
+        return jsonify({'error': 'Error searching recipes: {}'.format(str(e))}), 500
+
+@app.route('/api/pantry')
+def pantry_recipes():
+    """
+    Recipes that can be cooked from a pantry: every ingredient is among the
+    given ones, or all but max_missing of them.
+    """
+    ingredients = request.args.get('ingredients', '').lower().split(',')
+    ingredients = [i.strip() for i in ingredients if i.strip()]
+    vegetarian = request.args.get('vegetarian', '').lower() == 'true'
+    max_missing = request.args.get('max_missing', 0, type=int)
+    limit = request.args.get('limit', app.config['SEARCH_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['SEARCH_MAX_PAGE_SIZE']))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    if not ingredients:
+        return jsonify({'error': 'No ingredients provided'}), 400
+    if not 0 <= max_missing <= app.config['PANTRY_MAX_MISSING']:
+        return jsonify({'error': 'max_missing must be between 0 and {}'.format(app.config['PANTRY_MAX_MISSING'])}), 400
+    
+    try:
+        # Translate ingredients to English if in Italian
+        if g.lang_code == 'it':
+            ingredients = [translate_ingredient(ing, 'en') for ing in ingredients]
+        terms = list(search_key(ingredients, vegetarian, g.lang_code)[0])
+        favorites = get_favorite_ids(get_session_id())
+        
+        etag = http_cache.make_etag(
+            'pantry', terms, vegetarian, g.lang_code, max_missing, limit, offset,
+            catalog_state['version'], sorted(favorites)
+        )
+        cache_control = 'private, max-age={}'.format(app.config['SEARCH_CACHE_SECONDS'])
+        if http_cache.is_not_modified(etag):
+            return http_cache.not_modified(etag, cache_control=cache_control)
+        
+        matches = get_ingredient_index().pantry(terms, g.lang_code, max_missing, vegetarian_only=vegetarian)
+        total = len(matches)
+        if not total:
             return jsonify({'error': 'No matching recipes found'}), 404
-            
-        return jsonify(matching_recipes)
+        
+        page = range(offset, min(offset + limit, total))
+        page_ids = [int(matches.ids[i]) for i in page]
+        recipes = {recipe.id: recipe for recipe in load_recipes(page_ids)}
+        pantry_results = []
+        for i, recipe_id in zip(page, page_ids):
+            if recipe_id not in recipes:
+                continue
+            size = int(matches.sizes[i])
+            coverage = (size - int(matches.missing[i])) / size * 100 if size else 100.0
+            recipe_dict = build_recipe_result(recipes[recipe_id], coverage,
+                                              matches.missing_ingredients(recipe_id), favorites, g.lang_code)
+            recipe_dict['missing_count'] = int(matches.missing[i])
+            pantry_results.append(recipe_dict)
+        
+        response = jsonify(pantry_results)
+        response.headers['X-Total-Count'] = str(total)
+        if offset + limit < total:
+            response.headers['X-Next-Offset'] = str(offset + limit)
+        return http_cache.set_validators(response, etag, cache_control=cache_control)
         
     except Exception as e:
-        print(f"Error in get_recipes: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in pantry_recipes")
         return jsonify({'error': 'Error searching recipes: {}'.format(str(e))}), 500
 
 @app.route('/api/recipes/add', methods=['POST'])
@@ -386,6 +1012,7 @@ def add_recipe():
             image_url=data.get('image_url'),
             source_url=data.get('source_url')
         )
+        new_recipe.build_ingredient_rows()
         
         db.session.add(new_recipe)
         db.session.commit()
@@ -398,12 +1025,30 @@ def add_recipe():
         db.session.rollback()
         return jsonify({'error': 'Error adding recipe: {}'.format(str(e))}), 500
 
+# Columns of the favorites summary view: enough for a list, no JSON to parse
+FAVORITE_SUMMARY_FIELDS = ('id', 'title_en', 'title_it', 'vegetarian', 'vegan', 'category',
+                           'prep_time', 'cook_time', 'image_url')
+
+def get_favorite_ids(session_id):
+    """Recipe ids favorited by a session, read from the session index alone."""
+    return {recipe_id for (recipe_id,) in
+            db.session.query(Favorite.recipe_id).filter(Favorite.session_id == session_id)}
+
 @app.route('/api/favorites', methods=['GET'])
 def get_favorites():
     session_id = get_session_id()
     try:
-        favorites = Favorite.query.filter_by(session_id=session_id).all()
-        favorite_recipes = [favorite.recipe.to_dict() for favorite in favorites]
+        # One joined query, in the order the favorites were added
+        view = request.args.get('view', 'full')
+        columns = [getattr(Recipe, field) for field in FAVORITE_SUMMARY_FIELDS] if view == 'summary' else [Recipe]
+        query = (db.session.query(*columns)
+                 .join(Favorite, Favorite.recipe_id == Recipe.id)
+                 .filter(Favorite.session_id == session_id)
+                 .order_by(Favorite.created_at, Favorite.id))
+        if view == 'summary':
+            favorite_recipes = [dict(zip(FAVORITE_SUMMARY_FIELDS, row)) for row in query]
+        else:
+            favorite_recipes = [recipe.to_dict() for recipe in query]
         return jsonify(favorite_recipes)
     except Exception as e:
         return jsonify({'error': 'Error fetching favorites: {}'.format(str(e))}), 500
@@ -449,6 +1094,58 @@ def manage_favorite(recipe_id):
         db.session.rollback()
         return jsonify({'error': 'Error managing favorite: {}'.format(str(e))}), 500
 
+@app.route('/api/favorites/batch', methods=['POST'])
+def batch_favorites():
+    """
+    Add and remove many favorites in one transaction: {"add": [ids], "remove": [ids]}.
+    Removals are applied after additions, so an id in both lists ends up removed.
+    Ids of recipes that do not exist are not added and are listed under "unknown".
+    """
+    session_id = get_session_id()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object with "add" and "remove" lists'}), 400
+    add = data.get('add', [])
+    remove = data.get('remove', [])
+    for ids in (add, remove):
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': '"add" and "remove" must be lists of recipe ids'}), 400
+    if len(add) + len(remove) > app.config['FAVORITES_BATCH_MAX']:
+        return jsonify({'error': 'At most {} ids per batch'.format(app.config['FAVORITES_BATCH_MAX'])}), 400
+    
+    try:
+        add_ids = sorted(set(add) - set(remove))
+        remove_ids = sorted(set(remove))
+        # Chunks of 400 stay under SQLite's bound parameter limit
+        known_ids = []
+        for start in range(0, len(add_ids), 400):
+            known_ids.extend(recipe_id for (recipe_id,) in db.session.query(Recipe.id)
+                             .filter(Recipe.id.in_(add_ids[start:start + 400])))
+        
+        # Existing favorites are left alone instead of failing the whole batch
+        for start in range(0, len(known_ids), 400):
+            db.session.execute(
+                sqlite_insert(Favorite.__table__)
+                .values([{'recipe_id': recipe_id, 'session_id': session_id}
+                         for recipe_id in known_ids[start:start + 400]])
+                .on_conflict_do_nothing(index_elements=['recipe_id', 'session_id'])
+            )
+        for start in range(0, len(remove_ids), 400):
+            db.session.execute(
+                Favorite.__table__.delete()
+                .where(Favorite.session_id == session_id,
+                       Favorite.recipe_id.in_(remove_ids[start:start + 400]))
+            )
+        db.session.commit()
+        
+        return jsonify({
+            'favorites': sorted(get_favorite_ids(session_id)),
+            'unknown': sorted(set(add_ids) - set(known_ids))
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error updating favorites: {}'.format(str(e))}), 500
+
 # Recipe categories
 RECIPE_CATEGORIES = {
     'italian-traditions': _('Italian Traditions'),
@@ -459,28 +1156,26 @@ RECIPE_CATEGORIES = {
     'desserts': _('Desserts')
 }
 
-@app.route('/ricettario')
-def ricettario():
-    page = request.args.get('page', 1, type=int)
-    per_page = 12  # Show more recipes per page
-    search_query = request.args.get('q', '').strip()
-    selected_category = request.args.get('category', '')
-    
-    # Get current language
-    lang = g.get('lang_code', 'en')
-    
+def browse_catalog(search_query, selected_category, lang, per_page, after=None, before=None):
+    """Catalog page ordered by title, for browsing and for text search without FTS5."""
     # Base query
     query = Recipe.query
     
-    # Apply search filter if provided
+    # Apply search filter if provided (without FTS5: title and ingredient name substrings)
     if search_query:
         search = f"%{search_query}%"
+        # Anywhere in a parsed ingredient name, so "pepper" finds "black pepper";
+        # the scan reads the short name column rather than the JSON lists
+        name = normalize_name(search_query) or search_query.lower()
+        name_pattern = '%' + name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        ingredient_match = db.session.query(RecipeIngredient.recipe_id).filter(
+            RecipeIngredient.name.like(name_pattern, escape='\\')
+        )
         query = query.filter(
             db.or_(
                 Recipe.title_en.ilike(search),
                 Recipe.title_it.ilike(search),
-                Recipe.ingredients_en.ilike(search),
-                Recipe.ingredients_it.ilike(search)
+                Recipe.id.in_(ingredient_match)
             )
         )
     
@@ -502,52 +1197,87 @@ def ricettario():
         # Any other category
         query = query.filter_by(category=selected_category)
     
-    # Add consistent sorting to ensure pagination works correctly
-    if lang == 'it':
-        # Sort by Italian title if available, fall back to English title
-        query = query.order_by(
-            db.case(
-                (Recipe.title_it.isnot(None), Recipe.title_it),
-                else_=Recipe.title_en
-            ).asc()
-        )
+    # Seek on the indexed per-language title sort key, with the id as tie-breaker
+    sort_column = Recipe.sort_key_it if lang == 'it' else Recipe.sort_key_en
+    
+    # Without a text search the count comes from the category index; text
+    # searches are counted once per catalog version, if counting is enabled
+    if not search_query:
+        index = get_category_index()
+        total_recipes = index.count(selected_category) if selected_category else index.total
+    elif app.config['RICETTARIO_COUNT_SEARCHES']:
+        count_key = ('ricettario-count', search_query.lower(), selected_category)
+        cached = search_cache.get(count_key, catalog_state['version'])
+        if cached is None:
+            cached = (query.count(), [])
+            search_cache.set(count_key, catalog_state['version'], cached)
+        total_recipes = cached[0]
     else:
-        query = query.order_by(Recipe.title_en.asc())
-    
-    # Get total count for stats
-    total_recipes = query.count()
-    
-    # Get paginated results
-    recipes = query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    # If page is out of range, redirect to last page
-    if page > recipes.pages and recipes.pages > 0:
-        return redirect(url_for('ricettario', page=recipes.pages, q=search_query, category=selected_category))
-    
-    # Group recipes by category for display
-    categorized_recipes = {
-        'italian-traditions': [],
-        'healthy': [],
-        'quick-meals': [],
-        'vegetarian': [],
-        'vegan': [],
-        'desserts': []
-    }
+        total_recipes = None
+    
+    return keyset_page(query, sort_column, Recipe.id, per_page,
+                       after=after, before=before, total=total_recipes)
+
+def search_catalog(search_query, selected_category, per_page, after=None, before=None):
+    """Catalog page of full-text matches, best bm25 rank first."""
+    # The leading SEARCH_CACHE_DEPTH [score, id] pairs are cached per query and
+    # catalog version; category filters and pages past them read the whole list
+    cache_key = ('ricettario-fts', ' '.join(search_query.lower().split()))
+    cached = search_cache.get(cache_key, catalog_state['version'])
+    if cached is None:
+        hits = fulltext.search(db.session.connection(), search_query)
+        cached = (len(hits), hits[:app.config['SEARCH_CACHE_DEPTH']])
+        search_cache.set(cache_key, catalog_state['version'], cached)
+    total, hits = cached
+    page = None
+    if not selected_category:
+        page = list_page(hits, per_page, after=after, before=before)
+        if len(hits) < total and page.next_cursor is None and not before:
+            page = None
+    if page is None:
+        if len(hits) < total:
+            hits = fulltext.search(db.session.connection(), search_query)
+        if selected_category:
+            members = get_category_index().members(selected_category)
+            hits = [hit for hit in hits if hit[1] in members]
+        page = list_page(hits, per_page, after=after, before=before)
+    elif len(hits) < total:
+        page.total = total
+    recipes_by_id = {recipe.id: recipe for recipe in load_recipes(page.items)}
+    page.items = [recipes_by_id[recipe_id] for recipe_id in page.items if recipe_id in recipes_by_id]
+    return page
+
+@app.route('/ricettario')
+def ricettario():
+    # Opaque keyset cursors: the page after / before a given recipe
+    after = request.args.get('after')
+    before = request.args.get('before')
+    per_page = 12  # Show more recipes per page
+    search_query = request.args.get('q', '').strip()
+    selected_category = request.args.get('category', '')
+    
+    # Get current language
+    lang = g.get('lang_code', 'en')
+    
+    # The page only changes with the catalog, the language and the query string
+    etag = http_cache.make_etag('ricettario', lang, request.query_string, catalog_state['version'],
+                                app.config['BUILD_TOKEN'])
+    if http_cache.is_not_modified(etag, catalog_state['updated_at']):
+        return http_cache.not_modified(etag, catalog_state['updated_at'])
+    
+    if search_query and fulltext.available:
+        recipes = search_catalog(search_query, selected_category, per_page, after, before)
+    else:
+        recipes = browse_catalog(search_query, selected_category, lang, per_page, after, before)
+    total_recipes = recipes.total
+    
+    # A stale cursor past either end: start over from the first page
+    if not recipes.items and (after or before):
+        return redirect(url_for('ricettario', q=search_query or None, category=selected_category or None))
     
-    # Get all recipes for categorization
-    all_recipes = Recipe.query.all()
-    
-    for recipe in all_recipes:
-        # Assign recipes to categories based on their attributes
-        if recipe.category == 'italian-traditions' or recipe.title_it:
-            categorized_recipes['italian-traditions'].append(recipe)
-        elif recipe.category:
-            if recipe.category in categorized_recipes:
-                categorized_recipes[recipe.category].append(recipe)
-        if recipe.vegetarian:
-            categorized_recipes['vegetarian'].append(recipe)
-        if recipe.vegan:
-            categorized_recipes['vegan'].append(recipe)
+    # Recipe counts per category for the filter buttons
+    index = get_category_index()
+    category_counts = index.counts()
     
     # Create translated category display names for the view
     translated_categories = {}
@@ -559,25 +1289,30 @@ def ricettario():
             # Translate other categories according to the selected language
             translated_categories[key] = _(value)
     
-    return render_template(
+    response = make_response(render_template(
         'ricettario.html',
         recipes=recipes,
-        categorized_recipes=categorized_recipes,
+        category_counts=category_counts,
+        catalog_total=index.total,
         categories=translated_categories,
         search_query=search_query,
         selected_category=selected_category,
-        current_page=page,
         total_recipes=total_recipes
-    )
+    ))
+    return http_cache.set_validators(response, etag, catalog_state['updated_at'])
 
 @app.route('/ricetta/<int:id>')
 def recipe_detail(id):
-    # Get the recipe from database
-    recipe = Recipe.query.get_or_404(id)
-    
     # Get current language
     lang = g.get('lang_code', 'en')
     
+    etag = http_cache.make_etag('ricetta', id, lang, catalog_state['version'], app.config['BUILD_TOKEN'])
+    if http_cache.is_not_modified(etag, catalog_state['updated_at']):
+        return http_cache.not_modified(etag, catalog_state['updated_at'])
+    
+    # Get the recipe from database
+    recipe = Recipe.query.get_or_404(id)
+    
     # Directly use the image_url from the database, not through get_image_url method
     image_url = recipe.image_url
     
@@ -596,17 +1331,42 @@ def recipe_detail(id):
         'emoji': get_recipe_emoji(recipe.title_en)
     }
     
-    return render_template('ricetta.html', recipe=recipe_data)
+    response = make_response(render_template('ricetta.html', recipe=recipe_data))
+    return http_cache.set_validators(response, etag, catalog_state['updated_at'])
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    """Add a content hash to static URLs so they can be cached forever."""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        fingerprint = http_cache.static_fingerprint(app.static_folder, values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+def is_fingerprinted_static(response):
+    """True for a static file served under its current fingerprint (?v=)."""
+    version = request.args.get('v')
+    if not version or request.endpoint != 'static' or response.status_code != 200:
+        return False
+    filename = (request.view_args or {}).get('filename')
+    return filename is not None and version == http_cache.static_fingerprint(app.static_folder, filename)
 
 @app.after_request
 def add_header(response):
     """
-    Add headers to disable caching and enable CORS for static files.
+    Apply the caching policy and enable CORS for static files.
     """
-    # Disable caching for all responses
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+    if request.endpoint in ('static', 'static_files', 'serve_static'):
+        # URLs carrying the file's current fingerprint never change; anything
+        # else (other versions, the index.html fallback, errors) is revalidated
+        if is_fingerprinted_static(response):
+            response.headers['Cache-Control'] = http_cache.IMMUTABLE
+        else:
+            response.headers['Cache-Control'] = http_cache.REVALIDATE
+    elif 'Cache-Control' not in response.headers:
+        # Views that support conditional GETs set their own policy; nothing else is cached
+        response.headers["Cache-Control"] = http_cache.NO_STORE
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
     
     # CORS headers
     response.headers['Access-Control-Allow-Origin'] = '*'
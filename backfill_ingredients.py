@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Fill the recipe_ingredient table for recipes stored before it existed.
+Startup does the same (schema.upgrade_schema); this runs it on its own.
+Safe to run more than once: recipes that already have rows are skipped.
+"""
+from app import app, db, Recipe, RecipeIngredient
+
+BATCH_SIZE = 200
+
+def backfill_ingredients():
+    filled_count = 0
+    with app.app_context():
+        db.create_all()
+        has_rows = db.session.query(RecipeIngredient.recipe_id)
+        missing_ids = [
+            recipe_id for (recipe_id,) in
+            db.session.query(Recipe.id).filter(~Recipe.id.in_(has_rows)).order_by(Recipe.id)
+        ]
+        print(f"Found {len(missing_ids)} recipes without parsed ingredients")
+
+        for start in range(0, len(missing_ids), BATCH_SIZE):
+            chunk = missing_ids[start:start + BATCH_SIZE]
+            for recipe in Recipe.query.filter(Recipe.id.in_(chunk)):
+                recipe.build_ingredient_rows()
+                filled_count += 1
+            db.session.commit()
+            print(f"[{filled_count}/{len(missing_ids)}] recipes backfilled")
+
+    print(f"Backfill completed: {filled_count} recipes")
+
+if __name__ == "__main__":
+    backfill_ingredients()
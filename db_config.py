@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite tuning for the web app and the scripts that share its database.
+
+Every new SQLite connection gets the pragmas below: WAL journaling lets
+readers and a writer work at the same time (so an import no longer stalls
+live traffic), synchronous=NORMAL is safe under WAL and much cheaper per
+commit, and the mmap and page cache sizes keep hot pages in memory. Each
+process keeps a small pool of connections, and connections inherited over a
+fork (gunicorn --preload, multiprocessing) are dropped in the child instead
+of being shared with the parent.
+
+Optionally, SELECTs made while serving GET/HEAD requests go to a separate
+read-only engine: by default the same file opened read-only, or any
+DB_READ_REPLICA_URL. A request that writes sticks to the primary engine from
+its first write until the transaction ends.
+
+Environment variables:
+    SQLITE_JOURNAL_MODE   journal mode (default WAL)
+    SQLITE_SYNCHRONOUS    synchronous setting (default NORMAL)
+    SQLITE_MMAP_SIZE      bytes of the file to memory-map (default 268435456)
+    SQLITE_CACHE_SIZE     page cache, in pages or -KiB (default -65536, 64 MiB)
+    SQLITE_BUSY_TIMEOUT   ms to wait for a lock before failing (default 30000)
+    SQLITE_POOL_SIZE      connections kept per process (default 5)
+    DB_READ_REPLICA       1 to route GET reads to the read-only engine (default off)
+    DB_READ_REPLICA_URL   URL of that engine (default: the main file, read-only)
+"""
+import os
+import sqlite3
+
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+from logging_config import get_logger
+
+logger = get_logger('db')
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def pragma_settings():
+    return {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -65536)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 30000)),
+    }
+
+
+def is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database URI."""
+    options = {'connect_args': {'timeout': 30}}
+    if is_sqlite_file(uri):
+        # A per-process pool; the pool hands a connection to one thread at a time
+        options['connect_args']['check_same_thread'] = False
+        options['poolclass'] = QueuePool
+        options['pool_size'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))
+    return options
+
+
+def apply_pragmas(dbapi_connection, read_only=False):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    settings = pragma_settings()
+    cursor = dbapi_connection.cursor()
+    try:
+        if read_only:
+            # The journal mode is stored in the file; a read-only connection can't set it
+            cursor.execute('PRAGMA query_only = 1')
+        else:
+            cursor.execute('PRAGMA journal_mode = {}'.format(settings['journal_mode']))
+            cursor.execute('PRAGMA synchronous = {}'.format(settings['synchronous']))
+        cursor.execute('PRAGMA mmap_size = {:d}'.format(settings['mmap_size']))
+        cursor.execute('PRAGMA cache_size = {:d}'.format(settings['cache_size']))
+        cursor.execute('PRAGMA busy_timeout = {:d}'.format(settings['busy_timeout']))
+    finally:
+        cursor.close()
+
+
+def read_only_url(url):
+    """URL opening the same SQLite file read-only."""
+    return 'sqlite:///file:{}?mode=ro&uri=true'.format(url.database)
+
+
+def tune_engine(engine, read_only=False):
+    """Set the pragmas on every new connection, and drop inherited connections after a fork."""
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, read_only))
+    if hasattr(os, 'register_at_fork'):
+        # close=False: the parent still owns those connections
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the SELECTs of GET/HEAD requests to the read engine, if there is one."""
+
+    def __init__(self, db, **options):
+        self._db = db
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._use_read_engine(clause):
+            return self._db.read_engine
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def _use_read_engine(self, clause):
+        if self._db.read_engine is None or self.info.get('db_wrote'):
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if self._flushing or clause is None or not isinstance(clause, Select):
+            # Anything but a plain SELECT (flushes, DML, raw connections) may write
+            self.info['db_wrote'] = True
+            return False
+        return True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def reset_read_routing(session):
+    session.info.pop('db_wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with tuned SQLite engines and optional read routing."""
+
+    read_engine = None
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_engines(self, app):
+        """Tune the primary engine and create the read engine if it is enabled."""
+        with app.app_context():
+            engine = self.engine
+        tune_engine(engine)
+        if os.environ.get('DB_READ_REPLICA', '0') == '1':
+            url = os.environ.get('DB_READ_REPLICA_URL')
+            if not url and is_sqlite_file(str(engine.url)):
+                url = read_only_url(engine.url)
+            if url:
+                self.read_engine = create_engine(url, **engine_options(url))
+                tune_engine(self.read_engine, read_only=True)
+                logger.info("GET requests read from %s", self.read_engine.url)
+            else:
+                logger.warning("DB_READ_REPLICA is set but there is no read-only database to use")
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text search over the recipe catalog with SQLite FTS5.
+
+Each language has its own external-content FTS5 table mirroring that
+language's title, ingredients and instructions columns of ``recipe``, so each
+can use a tokenizer suited to the language. Triggers on ``recipe`` keep the
+tables in sync with every insert, update and delete, whoever makes them.
+Matches are ranked with bm25, titles weighing most, and every search word is
+matched as a prefix ("pomod" finds "pomodoro").
+
+Environment variables:
+    FTS_TOKENIZER_EN  tokenizer of the English table
+                      (default: porter unicode61 remove_diacritics 2)
+    FTS_TOKENIZER_IT  tokenizer of the Italian table
+                      (default: unicode61 remove_diacritics 2)
+
+SQLite ships no Italian stemmer, so the Italian table folds case and accents
+only ("perché" = "perche"). Changing a tokenizer rebuilds its table on the
+next startup.
+"""
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from logging_config import get_logger
+
+logger = get_logger('fulltext')
+
+# language -> FTS table, mirrored recipe columns, default tokenizer
+FTS_TABLES = {
+    'en': ('recipe_fts_en', ('title_en', 'ingredients_en', 'instructions_en'),
+           'porter unicode61 remove_diacritics 2'),
+    'it': ('recipe_fts_it', ('title_it', 'ingredients_it', 'instructions_it'),
+           'unicode61 remove_diacritics 2'),
+}
+
+# bm25 weights of the title, ingredients and instructions columns
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Words of a search query; everything else (including FTS5 syntax) is dropped
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Set by setup_fulltext(); False when SQLite was built without FTS5
+available = False
+
+
+def tokenizer_for(lang):
+    return os.environ.get('FTS_TOKENIZER_' + lang.upper(), FTS_TABLES[lang][2])
+
+
+def _create_table_sql(table, columns, tokenizer):
+    return ("CREATE VIRTUAL TABLE {} USING fts5({}, content='recipe', content_rowid='id', "
+            "tokenize='{}', prefix='2 3')").format(table, ', '.join(columns), tokenizer)
+
+
+def _trigger_sql(table, columns):
+    names = ', '.join(columns)
+    new_values = ', '.join('new.' + c for c in columns)
+    old_values = ', '.join('old.' + c for c in columns)
+    insert = "INSERT INTO {t}(rowid, {n}) VALUES (new.id, {v});".format(t=table, n=names, v=new_values)
+    delete = "INSERT INTO {t}({t}, rowid, {n}) VALUES ('delete', old.id, {v});".format(
+        t=table, n=names, v=old_values)
+    return (
+        "CREATE TRIGGER IF NOT EXISTS {t}_ai AFTER INSERT ON recipe BEGIN {i} END".format(t=table, i=insert),
+        "CREATE TRIGGER IF NOT EXISTS {t}_ad AFTER DELETE ON recipe BEGIN {d} END".format(t=table, d=delete),
+        "CREATE TRIGGER IF NOT EXISTS {t}_au AFTER UPDATE OF {n} ON recipe BEGIN {d} {i} END".format(
+            t=table, n=names, d=delete, i=insert),
+    )
+
+
+def setup_fulltext(engine):
+    """
+    Create the FTS tables and sync triggers if missing, rebuilding a table
+    whose tokenizer setting changed. Returns whether FTS5 is available.
+    """
+    global available
+    try:
+        with engine.begin() as connection:
+            for lang, (table, columns, _) in FTS_TABLES.items():
+                tokenizer = tokenizer_for(lang)
+                create_sql = _create_table_sql(table, columns, tokenizer)
+                existing = connection.execute(
+                    text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': table}
+                ).scalar()
+                if existing == create_sql:
+                    continue
+                if existing is not None:
+                    logger.info("Tokenizer of %s changed, rebuilding it", table)
+                    connection.execute(text('DROP TABLE {}'.format(table)))
+                connection.execute(text(create_sql))
+                for statement in _trigger_sql(table, columns):
+                    connection.execute(text(statement))
+                connection.execute(text("INSERT INTO {0}({0}) VALUES ('rebuild')".format(table)))
+                logger.info("Full-text table %s built (tokenize=%s)", table, tokenizer)
+    except OperationalError as e:
+        if 'fts5' not in str(e).lower():
+            raise
+        logger.warning("SQLite has no FTS5 module, catalog search falls back to LIKE: %s", e)
+        available = False
+        return False
+    available = True
+    return True
+
+
+def match_expression(query):
+    """FTS5 query matching every word of the user's query as a prefix, or None."""
+    words = _WORD_RE.findall(query.lower())
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def search(connection, query):
+    """
+    Ranked matches of query in either language, as [score, recipe_id] pairs
+    sorted best first (bm25 scores are negative; lower is better).
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    selects = [
+        "SELECT rowid AS id, bm25({t}, {w}) AS score FROM {t} WHERE {t} MATCH :q".format(t=table, w=weights)
+        for table, _, _ in FTS_TABLES.values()
+    ]
+    rows = connection.execute(text(
+        "SELECT id, MIN(score) AS score FROM ({}) GROUP BY id ORDER BY score, id".format(
+            ' UNION ALL '.join(selects))
+    ), {'q': expression}).fetchall()
+    return [[row.score, row.id] for row in rows]
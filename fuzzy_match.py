@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Typo-tolerant lookup of search words in the ingredient vocabulary.
+
+Search words are compared with vocabulary tokens as whole words, so "egg"
+finds "eggs" but no longer "eggplant". A word resolves to:
+
+1. the token itself and tokens sharing its plural stem ("egg", "eggs");
+2. failing that, tokens within a small edit distance ("tomatos" ->
+   "tomatoes"). Candidates come from a trigram index and only they are
+   compared letter by letter, under a time budget.
+
+Resolutions are cached per word, least recently used first out, until the
+vocabulary changes. Corrections cut short by the time budget are not cached,
+so a later lookup can finish them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Words shorter than this are never corrected: too many short words are one edit apart
+MIN_FUZZY_LENGTH = 4
+
+# Score of a token found by its plural stem, relative to an exact match
+STEM_SCORE = 0.95
+
+
+def plural_stem(word):
+    """Crude singular of an English word: tomatoes -> tomato, berries -> berry, eggs -> egg."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+        return word[:-2]
+    if len(word) > 2 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def trigrams(word):
+    """Trigrams of word padded with '$', so short words still have some."""
+    padded = '$' + word + '$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(word):
+    """Edits allowed when correcting word."""
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyResolver:
+    """Resolves search words to vocabulary tokens, exactly, by stem, or by edit distance."""
+
+    def __init__(self, budget=0.005, max_entries=4096):
+        # Seconds one fuzzy lookup may spend comparing candidates
+        self.budget = budget
+        self.max_entries = max_entries
+        # Lookups cut short by the budget; callers caching what they derive
+        # from resolve() compare it before and after to know the result is final
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._tokens = set()
+        self._stems = {}
+        self._trigrams = {}
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def add(self, token):
+        """Add a vocabulary token; cached resolutions are dropped."""
+        with self._lock:
+            if token in self._tokens:
+                return
+            self._tokens.add(token)
+            self._stems.setdefault(plural_stem(token), set()).add(token)
+            for gram in trigrams(token):
+                self._trigrams.setdefault(gram, set()).add(token)
+            self._cache.clear()
+
+    def resolve(self, word):
+        """
+        Vocabulary tokens word stands for, as a tuple of (token, score) with
+        the best first: 1.0 for the word itself, STEM_SCORE for another form
+        of it, and less for corrections, by edit distance.
+        """
+        with self._lock:
+            cached = self._cache.get(word)
+            if cached is not None:
+                self._cache.move_to_end(word)
+                return cached
+            resolved, complete = self._resolve(word)
+            if complete:
+                self._cache[word] = resolved
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            else:
+                self.timeouts += 1
+            return resolved
+
+    def _resolve(self, word):
+        """(tokens, complete), complete being False if the time budget ran out."""
+        found = {token: STEM_SCORE for token in self._stems.get(plural_stem(word), ())}
+        if word in self._tokens:
+            found[word] = 1.0
+        if found:
+            return tuple(sorted(found.items(), key=lambda item: (-item[1], item[0]))), True
+        return self._corrections(word)
+
+    def _corrections(self, word):
+        limit = max_edits(word)
+        if not limit:
+            return (), True
+        grams = trigrams(word)
+        # Every edit changes at most three trigrams
+        needed = len(grams) - 3 * limit
+        shared = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        candidates = sorted(
+            (token for token, count in shared.items() if count >= needed and abs(len(token) - len(word)) <= limit),
+            key=lambda token: (-shared[token], token)
+        )
+        deadline = time.perf_counter() + self.budget
+        matches = []
+        complete = True
+        for token in candidates:
+            if time.perf_counter() > deadline:
+                complete = False
+                break
+            distance = edit_distance(word, token, limit)
+            if distance <= limit:
+                matches.append((token, 1.0 - distance / max(len(word), len(token))))
+        return tuple(sorted(matches, key=lambda item: (-item[1], item[0]))), complete
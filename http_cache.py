@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for HTTP caching: fingerprinted static URLs and conditional GETs.
+"""
+import hashlib
+import os
+
+from flask import request, make_response
+
+# Cache-Control values used by the app's caching policy
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+NO_STORE = 'no-cache, no-store, must-revalidate'
+
+# filename -> (mtime, fingerprint)
+_fingerprints = {}
+
+
+def static_fingerprint(static_folder, filename):
+    """Short content hash of a static file, recomputed only when the file changes."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as file:
+        fingerprint = hashlib.md5(file.read()).hexdigest()[:12]
+    _fingerprints[filename] = (mtime, fingerprint)
+    return fingerprint
+
+
+def build_token(*folders):
+    """
+    Hash of the files under folders (templates, translations, static files),
+    worked out once at startup, so ETags of rendered pages change with a
+    deploy even when the catalog does not. Contents rather than modification
+    times are hashed, so every host of a deploy gets the same token.
+    """
+    digest = hashlib.md5()
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, folder).encode('utf-8'))
+                with open(path, 'rb') as file:
+                    digest.update(hashlib.md5(file.read()).digest())
+    return digest.hexdigest()[:12]
+
+
+def make_etag(*parts):
+    """Strong ETag value built from the parts that determine a response."""
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:20]
+
+
+def is_not_modified(etag, last_modified=None):
+    """True if the client's copy (If-None-Match / If-Modified-Since) is still current."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def set_validators(response, etag, last_modified=None, cache_control=REVALIDATE):
+    """Attach ETag, Last-Modified and Cache-Control to a response."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified(etag, last_modified=None, cache_control=REVALIDATE):
+    """Empty 304 response carrying the same validators as the full one."""
+    response = make_response('', 304)
+    return set_validators(response, etag, last_modified, cache_control)
@@ -1,154 +1,329 @@
 # -*- coding: utf-8 -*-
-from app import app, db, Recipe
-import json
+"""
+Import recipes from a JSON or JSONL file (default recipes.json) into the database.
+
+Recipes are matched to existing ones by English title: new ones are added,
+and existing ones updated only if their content hash changed, so re-importing
+the same file writes nothing. --prune also deletes the recipes missing from
+the file. The file is read as a stream (see recipe_stream.py), so it does not
+have to fit in memory. A diff summary is printed at the end.
+
+    python import_recipes.py [path] [--bulk] [--batch-size N] [--workers N] [--prune]
+
+By default every recipe is written and committed on its own. With --bulk the
+existing titles are loaded into one map and recipes are written in batches
+with bulk insert/update statements, one transaction per batch, which is much
+faster for large files. --workers N (0: one per CPU core) additionally moves
+the normalizing and ingredient parsing into N worker processes, which feed
+the single writer through a bounded queue. A database locked by another
+process is waited for (SQLite busy timeout) and the write retried with backoff.
+"""
+from app import app, db, Favorite, Recipe, RecipeIngredient, record_catalog_changes
+from recipe_stream import (chunked, complete_recipe, normalize_recipes, prepare_chunk,
+                           prepare_recipe, read_recipes, recipe_label, set_known_recipes)
+from schema import content_hash
+from sqlalchemy.exc import OperationalError
+import argparse
+import multiprocessing
 import os
+import queue
+import threading
 import time
 
-def import_recipes():
-    # Counter for added/updated recipes
+BATCH_SIZE = 500
+
+# Records per unit of work sent to a worker process, and chunks queued per worker
+WORKER_CHUNK_SIZE = 100
+QUEUED_CHUNKS_PER_WORKER = 4
+
+# Retries of a write that still finds the database locked after the busy timeout
+RETRY_ATTEMPTS = 5
+
+# Italian columns left unchanged on update when the source has no value for them
+ITALIAN_FIELDS = ('title_it', 'ingredients_it', 'instructions_it')
+
+def commit_with_retry(write):
+    """
+    Run write() and commit. SQLite already waits up to the busy timeout for
+    other writers; if the database is still locked, roll back and retry the
+    whole write with exponential backoff.
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            result = write()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if 'locked' not in str(e).lower() or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            delay = min(0.5 * 2 ** attempt, 8)
+            print(f"Database is busy, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def save_recipe(values):
+    """Add or update one recipe through the ORM. Returns 'added', 'updated' or 'unchanged'."""
+    values = dict(values, content_hash=content_hash(values))
+    existing_recipe = Recipe.query.filter_by(title_en=values['title_en']).first()
+    if existing_recipe:
+        if existing_recipe.content_hash == values['content_hash']:
+            return 'unchanged'
+        for field, value in values.items():
+            # Update Italian fields only if available
+            if field in ITALIAN_FIELDS and not value:
+                continue
+            setattr(existing_recipe, field, value)
+        existing_recipe.build_ingredient_rows()
+        return 'updated'
+    new_recipe = Recipe(**values)
+    new_recipe.build_ingredient_rows()
+    db.session.add(new_recipe)
+    return 'added'
+
+def write_batch(batch, existing):
+    """
+    Insert or update a batch of prepared, changed recipes (see
+    recipe_stream.prepare_recipe) with bulk statements, replace their parsed
+    ingredient rows and log the catalog changes. Bulk statements skip the ORM
+    events, so the sort keys, content hash, ingredient rows and change log are
+    written here. existing maps titles to (id, content hash).
+    Returns the inserted and the updated recipes as {title: (id, content hash)}.
+    """
+    inserts = []
+    updates = []
+    for values, ingredient_rows in batch:
+        values = dict(values)
+        if ingredient_rows is None:
+            # Only when the file repeats a title and goes back to its stored content
+            values, ingredient_rows = complete_recipe(values)
+        recipe_id = existing.get(values['title_en'], (None, None))[0]
+        if recipe_id is None:
+            inserts.append((values, ingredient_rows))
+        else:
+            # Update Italian fields only if available; without an Italian
+            # title the stored one and its sort key are kept
+            for field in ITALIAN_FIELDS:
+                if not values[field]:
+                    del values[field]
+            if 'title_it' not in values:
+                del values['sort_key_it']
+            values['id'] = recipe_id
+            updates.append((values, ingredient_rows))
+
+    db.session.bulk_insert_mappings(Recipe, [values for values, _ in inserts], return_defaults=True)
+    db.session.bulk_update_mappings(Recipe, [values for values, _ in updates])
+
+    # Replace the parsed ingredient rows of the languages that were written
+    ingredient_table = RecipeIngredient.__table__
+    for lang, ids in (('en', [v['id'] for v, _ in updates]),
+                      ('it', [v['id'] for v, _ in updates if 'ingredients_it' in v])):
+        for start in range(0, len(ids), BATCH_SIZE):
+            db.session.execute(ingredient_table.delete().where(
+                RecipeIngredient.recipe_id.in_(ids[start:start + BATCH_SIZE]),
+                RecipeIngredient.lang == lang
+            ))
+    db.session.bulk_insert_mappings(RecipeIngredient, [
+        dict(row, recipe_id=values['id'])
+        for values, ingredient_rows in inserts + updates
+        for row in ingredient_rows
+    ])
+
+    record_catalog_changes(
+        db.session.connection(),
+        [('insert', v['id']) for v, _ in inserts] + [('update', v['id']) for v, _ in updates]
+    )
+    written = lambda recipes: {v['title_en']: (v['id'], v['content_hash']) for v, _ in recipes}
+    return written(inserts), written(updates)
+
+def delete_recipes(recipe_ids):
+    """Delete recipes with their ingredient rows and favorites, and log the catalog changes."""
+    db.session.execute(RecipeIngredient.__table__.delete().where(RecipeIngredient.recipe_id.in_(recipe_ids)))
+    db.session.execute(Favorite.__table__.delete().where(Favorite.recipe_id.in_(recipe_ids)))
+    db.session.execute(Recipe.__table__.delete().where(Recipe.id.in_(recipe_ids)))
+    record_catalog_changes(db.session.connection(), [('delete', recipe_id) for recipe_id in recipe_ids])
+
+def prune_missing(seen_titles, batch_size=BATCH_SIZE):
+    """Delete the recipes whose title was not in the source. Returns how many were deleted."""
+    missing_ids = [recipe_id for recipe_id, title in db.session.query(Recipe.id, Recipe.title_en)
+                   if title not in seen_titles]
+    db.session.rollback()
+    for start in range(0, len(missing_ids), batch_size):
+        chunk = missing_ids[start:start + batch_size]
+        commit_with_retry(lambda: delete_recipes(chunk))
+    return len(missing_ids)
+
+def prepare_recipes(records):
+    """Yield (number, raw record, prepared recipe or None if invalid), in this process."""
+    for number, recipe_data in enumerate(records, 1):
+        yield number, recipe_data, prepare_recipe(recipe_data)
+
+def prepare_recipes_in_workers(records, workers, known_recipes=frozenset(), chunk_size=WORKER_CHUNK_SIZE):
+    """
+    Same as prepare_recipes(), with the normalizing and ingredient parsing
+    done by a pool of worker processes. A feeder thread reads the file and
+    hands chunks of records to the pool; the queue of pending chunks is
+    bounded, so reading stops while the writer is behind. Results come back
+    in file order. known_recipes is passed on to set_known_recipes() in each worker.
+    """
+    pending = queue.Queue(maxsize=workers * QUEUED_CHUNKS_PER_WORKER)
+    finished = object()
+
+    def feed(pool):
+        try:
+            for chunk in chunked(enumerate(records, 1), chunk_size):
+                pending.put(pool.apply_async(prepare_chunk, (chunk,)))
+        except Exception as e:
+            pending.put(e)
+        else:
+            pending.put(finished)
+
+    # Don't hand pooled database connections down to the forked workers
+    db.engine.dispose()
+    with multiprocessing.Pool(workers, initializer=set_known_recipes, initargs=(known_recipes,)) as pool:
+        threading.Thread(target=feed, args=(pool,), daemon=True).start()
+        while True:
+            item = pending.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item.get()
+
+def batch_by_title(prepared, batch_size):
+    """
+    Group the valid recipes of a prepare_recipes() stream into batches of up
+    to batch_size distinct titles; a repeated title within a batch keeps the
+    later entry. Invalid records are passed through as (number, raw, None).
+    """
+    batch = {}
+    number = None
+    for number, recipe_data, recipe in prepared:
+        if recipe is None:
+            yield number, recipe_data, None
+            continue
+        batch[recipe[0]['title_en']] = recipe
+        if len(batch) >= batch_size:
+            yield number, None, list(batch.values())
+            batch = {}
+    if batch:
+        yield number, None, list(batch.values())
+
+def import_recipes(json_path='recipes.json', bulk=False, batch_size=BATCH_SIZE, workers=1, prune=False):
+    # Counters for the diff summary
     added_count = 0
     updated_count = 0
+    unchanged_count = 0
+    deleted_count = 0
     skipped_count = 0
-    
+    read_count = 0
+    seen_titles = set()
+    started = time.monotonic()
+
     try:
-        print("Importing recipes from recipes.json...")
-        
+        print(f"Importing recipes from {json_path}...")
+
         # Read the JSON file
-        json_path = 'recipes.json'
         if not os.path.exists(json_path):
             print(f"Error: {json_path} file not found")
             return
-            
-        with open(json_path, 'r', encoding='utf-8') as file:
-            recipes_data = json.load(file)
-        
-        # Ensure we have a list of recipes
-        if isinstance(recipes_data, dict) and 'recipes' in recipes_data:
-            recipes_data = recipes_data['recipes']
-            
-        total_recipes = len(recipes_data)
-        print(f"Found {total_recipes} recipes in JSON file")
-        
-        # Process each recipe with a small delay to avoid database locks
-        for i, recipe_data in enumerate(recipes_data):
-            try:
-                # Extract recipe data with defaults
-                title = recipe_data.get('title', '').strip()
-                title_it = recipe_data.get('title_it', '').strip()
-
-                # Handle ingredients as either array or string
-                if isinstance(recipe_data.get('ingredients', []), list):
-                    ingredients = recipe_data.get('ingredients', [])
-                else:
-                    ingredients = recipe_data.get('ingredients', '').split(',')
-                    ingredients = [i.strip() for i in ingredients if i.strip()]
 
-                if isinstance(recipe_data.get('ingredients_it', []), list):
-                    ingredients_it = recipe_data.get('ingredients_it', [])
-                else:
-                    ingredients_it = recipe_data.get('ingredients_it', '').split(',')
-                    ingredients_it = [i.strip() for i in ingredients_it if i.strip()]
+        records = read_recipes(json_path)
 
-                # Handle instructions as either array or string
-                if isinstance(recipe_data.get('instructions', ''), list):
-                    instructions = recipe_data.get('instructions', [])
-                else:
-                    instructions = recipe_data.get('instructions', '').split('\n')
-                    instructions = [i.strip() for i in instructions if i.strip()]
+        if bulk:
+            # One map of existing titles and content hashes instead of a lookup per recipe
+            existing = {
+                title: (recipe_id, recipe_hash) for recipe_id, title, recipe_hash in
+                db.session.query(Recipe.id, Recipe.title_en, Recipe.content_hash)
+            }
+            db.session.rollback()
+            # Unchanged recipes skip the ingredient parsing, here and in the workers;
+            # a known hash under another title still gets parsed, by the workers
+            known_recipes = frozenset((title, recipe_hash) for title, (_, recipe_hash) in existing.items()
+                                      if recipe_hash)
+            set_known_recipes(known_recipes)
 
-                if isinstance(recipe_data.get('instructions_it', ''), list):
-                    instructions_it = recipe_data.get('instructions_it', [])
-                else:
-                    instructions_it = recipe_data.get('instructions_it', '').split('\n')
-                    instructions_it = [i.strip() for i in instructions_it if i.strip()]
-
-                vegetarian = recipe_data.get('vegetarian', False)
-                vegan = recipe_data.get('vegan', False)
-                category = recipe_data.get('category', 'quick-meals')
-                
-                # If a recipe is vegan, it's also vegetarian
-                if vegan and not vegetarian:
-                    vegetarian = True
-                
-                # Italian recipes should be in the italian-traditions category
-                if title_it and not category:
-                    category = 'italian-traditions'
-                    
-                image_url = recipe_data.get('image_url', None)
-                source_url = recipe_data.get('source_url', None)
-                
-                # Special debug for carbonara recipe
-                if title == 'Classic Spaghetti Carbonara':
-                    print(f"CARBONARA IMAGE URL: {image_url}")
-                
-                # Skip if no title or required fields are missing
-                if not title or not ingredients or not instructions:
-                    print(f"Skipping invalid recipe: {title}")
+            if workers > 1:
+                print(f"Preparing recipes in {workers} worker processes")
+                prepared = prepare_recipes_in_workers(records, workers, known_recipes)
+            else:
+                prepared = prepare_recipes(records)
+
+            for number, recipe_data, batch in batch_by_title(prepared, batch_size):
+                read_count = number
+                if batch is None:
+                    print(f"Skipping invalid recipe {number}: {recipe_label(recipe_data)}")
                     skipped_count += 1
                     continue
-                
-                # Check if recipe already exists
-                existing_recipe = Recipe.query.filter_by(title_en=title).first()
-                if existing_recipe:
-                    # Update existing recipe
-                    existing_recipe.title_en = title
-                    existing_recipe.ingredients_en = json.dumps(ingredients)
-                    existing_recipe.instructions_en = json.dumps(instructions)
-                    
-                    # Update Italian fields if available
-                    if title_it:
-                        existing_recipe.title_it = title_it
-                    if ingredients_it:
-                        existing_recipe.ingredients_it = json.dumps(ingredients_it)
-                    if instructions_it:
-                        existing_recipe.instructions_it = json.dumps(instructions_it)
-                    
-                    existing_recipe.vegetarian = vegetarian
-                    existing_recipe.vegan = vegan
-                    existing_recipe.category = category
-                    existing_recipe.image_url = image_url
-                    existing_recipe.source_url = source_url
+                changed = []
+                for recipe in batch:
+                    title = recipe[0]['title_en']
+                    seen_titles.add(title)
+                    if existing.get(title, (None, None))[1] == recipe[0]['content_hash']:
+                        unchanged_count += 1
+                    else:
+                        changed.append(recipe)
+                if changed:
+                    try:
+                        inserted, updated = commit_with_retry(lambda: write_batch(changed, existing))
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Error writing batch of {len(changed)} recipes: {str(e)}")
+                        skipped_count += len(changed)
+                    else:
+                        added_count += len(inserted)
+                        updated_count += len(updated)
+                        existing.update(inserted)
+                        existing.update(updated)
+                rate = read_count / max(time.monotonic() - started, 1e-9)
+                print(f"[{read_count}] {added_count} added, {updated_count} updated, "
+                      f"{unchanged_count} unchanged, {rate:.0f} rows/s")
+        else:
+            for number, recipe_data, values in normalize_recipes(records):
+                read_count = number
+                if values is None:
+                    print(f"Skipping invalid recipe {number}: {recipe_label(recipe_data)}")
+                    skipped_count += 1
+                    continue
+                seen_titles.add(values['title_en'])
+                try:
+                    # Commit every recipe to avoid large transactions
+                    outcome = commit_with_retry(lambda: save_recipe(values))
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error processing recipe {number}: {str(e)}")
+                    skipped_count += 1
+                    continue
+                if outcome == 'added':
+                    added_count += 1
+                    print(f"[{number}] Added recipe: {values['title_en']}")
+                elif outcome == 'updated':
                     updated_count += 1
-                    print(f"[{i+1}/{total_recipes}] Updated recipe: {title}")
+                    print(f"[{number}] Updated recipe: {values['title_en']}")
                 else:
-                    # Create new recipe
-                    new_recipe = Recipe(
-                        title_en=title,
-                        title_it=title_it if title_it else None,
-                        ingredients_en=json.dumps(ingredients),
-                        ingredients_it=json.dumps(ingredients_it) if ingredients_it else None,
-                        instructions_en=json.dumps(instructions),
-                        instructions_it=json.dumps(instructions_it) if instructions_it else None,
-                        vegetarian=vegetarian,
-                        vegan=vegan,
-                        category=category,
-                        image_url=image_url,
-                        source_url=source_url
-                    )
-                    db.session.add(new_recipe)
-                    added_count += 1
-                    print(f"[{i+1}/{total_recipes}] Added recipe: {title}")
-                
-                # Commit every recipe to avoid large transactions
-                db.session.commit()
-                
-                # Small delay to prevent database locks
-                time.sleep(0.2)
-                
-            except Exception as e:
-                db.session.rollback()
-                print(f"Error processing recipe {i+1}: {str(e)}")
-                skipped_count += 1
-                time.sleep(0.5)  # Longer delay after an error
-                continue
-        
+                    unchanged_count += 1
+
+        # Only a source read to the end says which recipes are gone
+        if prune:
+            if seen_titles:
+                deleted_count = prune_missing(seen_titles, batch_size)
+            else:
+                print("No recipes read, not deleting anything")
+
+        elapsed = time.monotonic() - started
         print("\nImport completed:")
+        print(f"Read {read_count} recipes")
         print(f"Added {added_count} new recipes")
-        print(f"Updated {updated_count} existing recipes")
+        print(f"Updated {updated_count} changed recipes")
+        print(f"Unchanged {unchanged_count} recipes")
+        if prune:
+            print(f"Deleted {deleted_count} recipes missing from {json_path}")
         print(f"Skipped {skipped_count} recipes")
-        
+        print(f"Processed {read_count} rows in {elapsed:.1f}s ({read_count / max(elapsed, 1e-9):.0f} rows/s)")
+
     except ValueError as e:
-        print(f"Error: Invalid JSON format in recipes.json: {str(e)}")
+        print(f"Error: Invalid JSON format in {json_path} after {read_count} recipes: {str(e)}")
+        if prune:
+            print("Nothing was deleted, since the file could not be read to the end")
     except Exception as e:
         print(f"Error importing recipes: {str(e)}")
         try:
@@ -157,5 +332,17 @@ def import_recipes():
             pass
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import recipes from a JSON file.")
+    parser.add_argument('path', nargs='?', default='recipes.json', help="JSON or JSONL file to import (default: recipes.json)")
+    parser.add_argument('--bulk', action='store_true', help="write recipes in batches with bulk statements")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="recipes per transaction in bulk mode")
+    parser.add_argument('--prune', action='store_true', help="delete recipes that are not in the file")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes parsing recipes for the bulk writer (0: one per CPU core; implies --bulk)")
+    args = parser.parse_args()
+    workers = 1
+    if args.workers is not None:
+        workers = args.workers if args.workers > 0 else os.cpu_count() or 1
     with app.app_context():
-        import_recipes() 
\ No newline at end of file
+        import_recipes(args.path, bulk=args.bulk or args.workers is not None,
+                       batch_size=args.batch_size, workers=workers, prune=args.prune)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Split recipe ingredient lines into quantity, unit and a normalized name.
+Example: "350g spaghetti" -> ParsedIngredient(quantity=350.0, unit='g', name='spaghetti', ...)
+
+Names are resolved against the ingredient dictionary in translations.py with an
+automaton built once at import, always taking the longest dictionary phrase.
+Results are memoized, since the same lines come back on every search.
+"""
+import json
+import re
+from fractions import Fraction
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from phrase_matcher import PhraseMatcher
+from translations import UNIT_TRANSLATIONS, INGREDIENT_TRANSLATIONS, REVERSE_TRANSLATIONS
+
+# Spellings of each unit, mapped to the English key used in UNIT_TRANSLATIONS
+UNIT_ALIASES = {unit: unit for unit in UNIT_TRANSLATIONS}
+UNIT_ALIASES.update({italian: english for english, italian in UNIT_TRANSLATIONS.items()})
+UNIT_ALIASES.update({
+    'gr': 'g', 'gram': 'g', 'grams': 'g', 'grammi': 'g',
+    'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'millilitre': 'ml', 'milliliter': 'ml', 'millilitres': 'ml', 'milliliters': 'ml',
+    'litre': 'l', 'liter': 'l', 'litres': 'l', 'liters': 'l', 'litri': 'l', 'litro': 'l',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'cucchiai': 'tbsp',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'cucchiaini': 'tsp',
+    'cups': 'cup', 'tazze': 'cup',
+    'spicchio': 'clove', 'spicchi': 'cloves',
+    'mazzi': 'bunch', 'pizzichi': 'pinch',
+})
+
+# Units written straight after the number: "350g", "400ml"
+ATTACHED_UNITS = {'g', 'kg', 'ml', 'l'}
+
+# Trailing phrases meaning "as much as needed"
+TO_TASTE = ('to taste', 'quanto basta', 'q.b.', 'qb')
+
+# Size and preparation words that do not change what the ingredient is
+DESCRIPTORS = {
+    'large', 'small', 'medium', 'fresh', 'freshly', 'ground', 'chopped', 'minced',
+    'grated', 'sliced', 'diced', 'dried', 'whole', 'extra', 'virgin',
+    'grande', 'grandi', 'piccolo', 'piccola', 'piccoli', 'piccole', 'medio', 'media',
+    'fresco', 'fresca', 'freschi', 'fresche', 'tritato', 'tritata', 'grattugiato',
+    'grattugiata', 'affettato', 'affettata', 'macinato', 'macinata',
+}
+
+# Unicode vulgar fractions, as written in many recipe sources
+VULGAR_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4', '⅕': '1/5', '⅖': '2/5',
+    '⅗': '3/5', '⅘': '4/5', '⅙': '1/6', '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+_FRACTION_CHARS = ''.join(VULGAR_FRACTIONS)
+
+# Leading quantity, optionally glued to a unit: "350g", "1/2", "1.5", "2-3", "1½", "½"
+_QUANTITY_RE = re.compile(
+    r"^((?:\d+(?:[.,]\d+)?(?:/\d+)?[{0}]?|[{0}]))(?:-\d+(?:[.,]\d+)?)?((?:(?![{0}])[^\W\d_])*)$".format(_FRACTION_CHARS)
+)
+# Fraction part of a mixed number, after its whole part: the "1/2" or "½" of "1 1/2"
+_FRACTION_RE = re.compile(r"^(\d+/\d+|[{0}])((?:(?![{0}])[^\W\d_])*)$".format(_FRACTION_CHARS))
+_PARENTHESES_RE = re.compile(r"\([^)]*\)")
+
+
+class ParsedIngredient(NamedTuple):
+    """An ingredient line split into its parts."""
+    quantity: Optional[float]       # 0.5 for "1/2"
+    unit: Optional[str]             # English unit key, e.g. 'cloves' for "spicchi"
+    name: str                       # normalized name, e.g. "aglio"
+    canonical: Optional[str]        # English dictionary entry found in the name, e.g. "garlic"
+    quantity_text: Optional[str]    # quantity as written, e.g. "1/2"
+    label: str                      # name as written, e.g. "Pecorino Romano"
+
+
+def _dictionary_phrases():
+    # Singular/plural variants first, so real dictionary entries win over them:
+    # "tomato" and "egg" should find the plural entries too
+    for english in INGREDIENT_TRANSLATIONS:
+        if english.endswith('es'):
+            yield english[:-2], english
+        if english.endswith('s'):
+            yield english[:-1], english
+        else:
+            yield english + 's', english
+    for italian, english in REVERSE_TRANSLATIONS.items():
+        yield italian, english
+    for english in INGREDIENT_TRANSLATIONS:
+        yield english, english
+
+
+_matcher = PhraseMatcher(_dictionary_phrases())
+
+
+def parse_quantity(text):
+    """Turn "2", "1.5", "1,5", "1/2", "1 1/2", "½" or "1½" into a float, or None."""
+    for char, fraction in VULGAR_FRACTIONS.items():
+        text = text.replace(char, ' ' + fraction)
+    try:
+        return float(sum(Fraction(part) for part in text.replace(',', '.').split()))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def normalize_name(text):
+    """Lowercase an ingredient name and drop notes and descriptor words."""
+    text = _PARENTHESES_RE.sub(' ', text.lower())
+    text = text.split(',')[0]
+    words = [w.strip(".;:") for w in text.split()]
+    words = [w for w in words if w and w not in DESCRIPTORS]
+    # "of garlic", "di pollo", "d'aglio"
+    while words and words[0] in ('of', 'di', 'del', 'della'):
+        words = words[1:]
+    if words and words[0].startswith("d'"):
+        words[0] = words[0][2:]
+    return ' '.join(words)
+
+
+def find_canonical(name):
+    """English dictionary entry for the longest dictionary phrase in name, or None."""
+    return _matcher.longest(name)
+
+
+@lru_cache(maxsize=16384)
+def parse_ingredient(text):
+    """Split an ingredient line into a ParsedIngredient."""
+    words = (text or '').strip().split()
+    quantity = None
+    quantity_text = None
+    unit = None
+    if words:
+        match = _QUANTITY_RE.match(words[0])
+        if match:
+            quantity_text = match.group(1)
+            attached = match.group(2).lower()
+            words = words[1:]
+            # Mixed number: "1 1/2", "2 ½"
+            fraction = _FRACTION_RE.match(words[0]) if words and quantity_text.isdigit() and not attached else None
+            if fraction:
+                quantity_text = '{} {}'.format(quantity_text, fraction.group(1))
+                attached = fraction.group(2).lower()
+                words = words[1:]
+            quantity = parse_quantity(quantity_text)
+            if attached in UNIT_ALIASES:
+                unit = UNIT_ALIASES[attached]
+    if unit is None and words and words[0].lower() in UNIT_ALIASES:
+        unit = UNIT_ALIASES[words[0].lower()]
+        words = words[1:]
+    label = ' '.join(words)
+    lowered = label.lower()
+    for phrase in TO_TASTE:
+        if lowered == phrase or lowered.endswith(' ' + phrase):
+            label = label[:len(label) - len(phrase)].rstrip(' ,')
+            unit = unit or 'to taste'
+            break
+    name = normalize_name(label)
+    return ParsedIngredient(quantity, unit, name, find_canonical(name), quantity_text, label)
+
+
+def format_ingredient(parsed, target_lang='en'):
+    """Put a ParsedIngredient back together, translating the unit and name."""
+    parts = []
+    unit = parsed.unit
+    if unit and target_lang == 'it':
+        unit = UNIT_TRANSLATIONS.get(unit, unit)
+    if parsed.quantity_text:
+        if parsed.unit in ATTACHED_UNITS:
+            parts.append(parsed.quantity_text + unit)
+            unit = None
+        else:
+            parts.append(parsed.quantity_text)
+    if unit and parsed.unit != 'to taste':
+        parts.append(unit)
+    if parsed.canonical:
+        name = parsed.canonical
+        if target_lang == 'it':
+            name = INGREDIENT_TRANSLATIONS.get(name, name)
+    else:
+        name = parsed.label
+    parts.append(name)
+    if parsed.unit == 'to taste':
+        parts.append(unit)
+    return ' '.join(p for p in parts if p)
+
+
+def ingredient_row_mappings(ingredients_en, ingredients_it=None):
+    """Column values of the parsed RecipeIngredient rows for a recipe's JSON ingredient columns."""
+    rows = []
+    for lang, value in (('en', ingredients_en), ('it', ingredients_it)):
+        if not value:
+            continue
+        for position, text in enumerate(json.loads(value)):
+            parsed = parse_ingredient(text)
+            if not parsed.name:
+                continue
+            rows.append({
+                'lang': lang, 'position': position, 'quantity': parsed.quantity,
+                'unit': parsed.unit, 'name': parsed.name
+            })
+    return rows
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Structured, leveled logging for the web app.
+
+Every record carries the id of the request it was logged from (taken from an
+incoming X-Request-ID header or generated), so the lines of one request can be
+followed across gunicorn workers. DEBUG records are sampled per request:
+LOG_SAMPLE_RATE=0.1 keeps the debug lines of one request in ten, and below
+the configured level nothing is formatted at all.
+
+Environment variables:
+    LOG_LEVEL        DEBUG, INFO (default), WARNING, ...
+    LOG_FORMAT       json (default) or text
+    LOG_SAMPLE_RATE  share of requests whose DEBUG records are kept (default 1.0)
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOGGER_NAME = 'mealmatch'
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+def get_logger(name=None):
+    """Logger under the app's namespace, e.g. get_logger('search') -> mealmatch.search"""
+    return logging.getLogger(LOGGER_NAME if not name else '{}.{}'.format(LOGGER_NAME, name))
+
+
+def current_request_id():
+    if has_request_context():
+        return g.get('request_id', '-')
+    return '-'
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request id, and drops DEBUG records of requests not sampled."""
+
+    def filter(self, record):
+        record.request_id = current_request_id()
+        if record.levelno <= logging.DEBUG and has_request_context():
+            return g.get('log_sampled', True)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields included."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(app):
+    """Set up the app logger and the per-request id and sampling."""
+    level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.addFilter(RequestContextFilter())
+    if os.environ.get('LOG_FORMAT', 'json') == 'text':
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+        ))
+    else:
+        handler.setFormatter(JsonFormatter())
+
+    logger = get_logger()
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+        g.log_sampled = sample_rate >= 1 or random.random() < sample_rate
+
+    @app.after_request
+    def echo_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    return logger
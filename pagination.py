@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset (seek) pagination with opaque cursors.
+
+Instead of OFFSET, each page starts right after (or right before) the sort key
+and id of the last row the client saw, so with an index on (sort key, id)
+every page costs the same however deep it is. Cursors are url-safe base64 of
+that (sort key, id) pair; clients should treat them as opaque.
+
+list_page() pages an already ranked in-memory list the same way, so ranked
+results and database listings share one cursor format.
+"""
+import base64
+import bisect
+import binascii
+import json
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(sort_key, row_id):
+    raw = json.dumps([sort_key, row_id], separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort_key, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_key, row_id = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(sort_key, (str, int, float)) or not isinstance(row_id, int):
+        return None
+    return sort_key, row_id
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_page(query, sort_column, id_column, per_page, after=None, before=None, total=None):
+    """
+    Fetch the page of query ordered by (sort_column, id_column) that follows
+    the `after` cursor, or precedes the `before` cursor, or the first page.
+    """
+    key = tuple_(sort_column, id_column)
+    position = decode_cursor(before)
+    backwards = position is not None
+    if not backwards:
+        position = decode_cursor(after)
+
+    if backwards:
+        query = query.filter(key < tuple_(*position)).order_by(sort_column.desc(), id_column.desc())
+    else:
+        if position is not None:
+            query = query.filter(key > tuple_(*position))
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # One extra row tells whether there is anything beyond this page
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    # Coming from a cursor means there is a page on the side we came from
+    if backwards:
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, position is not None
+    next_cursor = cursor_of(rows[-1]) if rows and has_next else None
+    prev_cursor = cursor_of(rows[0]) if rows and has_prev else None
+    return KeysetPage(rows, per_page, next_cursor, prev_cursor, total)
+
+
+def list_page(keys, per_page, after=None, before=None):
+    """
+    Same as keyset_page() over a list of [sort key, id] pairs sorted
+    ascending. The page's items are the ids.
+    """
+    def position_of(cursor):
+        # A cursor from the other kind of listing (text vs number keys) is ignored
+        position = decode_cursor(cursor)
+        if position is None or not keys or isinstance(position[0], str) != isinstance(keys[0][0], str):
+            return None
+        return position
+
+    position = position_of(before)
+    backwards = position is not None
+    if backwards:
+        end = bisect.bisect_left(keys, list(position))
+        start = max(end - per_page, 0)
+        has_next, has_prev = True, start > 0
+    else:
+        position = position_of(after)
+        start = bisect.bisect_right(keys, list(position)) if position is not None else 0
+        end = start + per_page
+        has_next, has_prev = end < len(keys), position is not None
+    rows = keys[start:end]
+    next_cursor = encode_cursor(*rows[-1]) if rows and has_next else None
+    prev_cursor = encode_cursor(*rows[0]) if rows and has_prev else None
+    return KeysetPage([row_id for _, row_id in rows], per_page, next_cursor, prev_cursor, len(keys))
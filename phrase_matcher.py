@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick automaton for finding dictionary phrases inside ingredient text.
+
+The automaton is built once from the dictionary, so looking up a piece of text
+costs time proportional to the text, however many phrases the dictionary has.
+"""
+from collections import deque
+
+
+class PhraseMatcher:
+    """Finds the longest dictionary phrase that occurs as whole words in a text."""
+
+    def __init__(self, phrases):
+        """phrases: iterable of (phrase, value); later duplicates replace earlier ones."""
+        self._goto = [{}]
+        self._fail = [0]
+        # state -> list of (phrase length, value) for every phrase ending there
+        self._output = [[]]
+        values = {}
+        for phrase, value in phrases:
+            phrase = phrase.lower()
+            if phrase:
+                values[phrase] = value
+        for phrase, value in values.items():
+            self._insert(phrase, value)
+        self._link()
+
+    def __len__(self):
+        return len(self._goto)
+
+    def _insert(self, phrase, value):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(phrase), value))
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # Phrases ending at the fallback state also end here
+                self._output[next_state] = (
+                    self._output[next_state] + self._output[self._fail[next_state]]
+                )
+
+    def iter_matches(self, text):
+        """Yield (start, end, value) for every whole-word phrase in text."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not output[state]:
+                continue
+            end = index + 1
+            if end < len(text) and text[end].isalnum():
+                continue
+            for length, value in output[state]:
+                start = end - length
+                if start == 0 or not text[start - 1].isalnum():
+                    yield start, end, value
+
+    def longest(self, text):
+        """Value of the longest whole-word phrase in text (leftmost on ties), or None."""
+        best = None
+        best_key = None
+        for start, end, value in self.iter_matches(text):
+            key = (end - start, -start)
+            if best_key is None or key > best_key:
+                best = value
+                best_key = key
+        return best
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Per-process cache of decoded recipes.
+
+Ingredients and instructions are stored as JSON text, and every read path
+(search results, the ricettario cards, the detail page, favorites) used to
+decode them again on each request. The cache keeps one immutable RecipeView
+per recipe, holding those lists already decoded into tuples for both
+languages. Entries are keyed by recipe id and tagged with the row's content
+hash, so a changed recipe is decoded again the next time it is read. The hash
+is the source record's, and the importer keeps stored Italian fields a source
+leaves out, so the same hash can come back for different columns: the app
+also discards the entries of recipes its catalog sync reports as written. The
+least recently used entries are evicted beyond max_entries.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+
+def _decode(value):
+    return tuple(json.loads(value)) if value else None
+
+
+class RecipeView:
+    """Decoded ingredient and instruction lists of one recipe version."""
+
+    __slots__ = ('id', 'version', 'ingredients_en', 'ingredients_it', 'instructions_en', 'instructions_it')
+
+    def __init__(self, row):
+        object.__setattr__(self, 'id', row.id)
+        object.__setattr__(self, 'version', row.content_hash)
+        object.__setattr__(self, 'ingredients_en', _decode(row.ingredients_en) or ())
+        object.__setattr__(self, 'ingredients_it', _decode(row.ingredients_it))
+        object.__setattr__(self, 'instructions_en', _decode(row.instructions_en) or ())
+        object.__setattr__(self, 'instructions_it', _decode(row.instructions_it))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RecipeView is immutable")
+
+    def __repr__(self):
+        return '<RecipeView {} {}>'.format(self.id, self.version)
+
+    def ingredients(self, lang='en'):
+        """Ingredients in the language, falling back to English."""
+        if lang == 'it' and self.ingredients_it:
+            return self.ingredients_it
+        return self.ingredients_en
+
+    def instructions(self, lang='en'):
+        """Instructions in the language, falling back to English."""
+        if lang == 'it' and self.instructions_it:
+            return self.instructions_it
+        return self.instructions_en
+
+
+class RecipeCache:
+    """LRU cache of RecipeView by recipe id, checked against the row's content hash."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def view(self, row):
+        """
+        RecipeView of a row with id, content_hash and the four JSON columns,
+        decoded only if this version is not cached yet. Rows without a content
+        hash (not written yet) are decoded but not cached.
+        """
+        if row.content_hash is None:
+            return RecipeView(row)
+        with self._lock:
+            view = self._entries.get(row.id)
+            if view is not None and view.version == row.content_hash:
+                self._entries.move_to_end(row.id)
+                self.hits += 1
+                return view
+            self.misses += 1
+        # Decode outside the lock; a concurrent miss on the same recipe just decodes twice
+        view = RecipeView(row)
+        with self._lock:
+            self._entries[row.id] = view
+            self._entries.move_to_end(row.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return view
+
+    def discard(self, recipe_id):
+        with self._lock:
+            self._entries.pop(recipe_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming readers for recipe files, for imports larger than memory.
+
+Two formats are read one recipe at a time:
+
+- JSONL (``.jsonl`` / ``.ndjson``): one recipe object per line.
+- JSON: a ``{"recipes": [...]}`` object or a bare ``[...]`` array, parsed
+  incrementally with ``json.JSONDecoder.raw_decode`` over fixed-size chunks,
+  so only the recipe being decoded is held in memory.
+
+The stages are generators (read -> normalize -> prepare -> batch), so memory
+stays bounded by the batch size whatever the file size. This module does not
+import the app, so its stages can run in worker processes without a database.
+"""
+import json
+import re
+
+from ingredient_parser import ingredient_row_mappings
+from schema import content_hash, title_sort_key
+
+CHUNK_SIZE = 1 << 16
+
+# A single recipe larger than this is treated as a malformed file
+MAX_RECORD_SIZE = 16 << 20
+
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+
+_WHITESPACE = ' \t\r\n'
+
+# Start of the recipe list in a {"recipes": [...]} document
+_RECIPES_KEY_RE = re.compile(r'"recipes"\s*:\s*\[')
+
+
+def iter_jsonl(file):
+    """Yield one object per non-blank line of a JSONL file."""
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError("line {}: {}".format(number, e)) from None
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """
+    Yield the items of the recipe array of a JSON document, either the value
+    of its "recipes" key or the document itself when it is an array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        chunk = file.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+    # Find the opening bracket of the array
+    while True:
+        read_more()
+        stripped = buffer.lstrip(_WHITESPACE)
+        if stripped.startswith('['):
+            position = len(buffer) - len(stripped) + 1
+            break
+        match = _RECIPES_KEY_RE.search(buffer)
+        if match:
+            position = match.end()
+            break
+        if eof:
+            raise ValueError("no recipe array found")
+
+    while True:
+        # Skip separators; stop at the closing bracket
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE + ',':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            read_more()
+        if position >= len(buffer):
+            raise ValueError("unexpected end of file inside the recipe array")
+        if buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # The item is cut off at the end of the buffer: read on
+            if eof or len(buffer) - position > MAX_RECORD_SIZE:
+                raise
+            read_more()
+            continue
+        yield item
+        # Drop what has been decoded so the buffer stays one item long
+        buffer = buffer[end:]
+        position = 0
+
+
+def read_recipes(path, chunk_size=CHUNK_SIZE):
+    """Yield the raw recipe objects of a JSON or JSONL file, one at a time."""
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.lower().endswith(JSONL_EXTENSIONS):
+            yield from iter_jsonl(file)
+        else:
+            yield from iter_json_array(file, chunk_size)
+
+
+def normalize_recipe(recipe_data):
+    """Recipe column values for one JSON recipe, or None if it is missing required fields."""
+    if not isinstance(recipe_data, dict):
+        return None
+
+    title = (recipe_data.get('title') or '').strip()
+    title_it = (recipe_data.get('title_it') or '').strip()
+
+    # Handle ingredients as either array or string
+    if isinstance(recipe_data.get('ingredients', []), list):
+        ingredients = recipe_data.get('ingredients', [])
+    else:
+        ingredients = recipe_data.get('ingredients', '').split(',')
+        ingredients = [i.strip() for i in ingredients if i.strip()]
+
+    if isinstance(recipe_data.get('ingredients_it', []), list):
+        ingredients_it = recipe_data.get('ingredients_it', [])
+    else:
+        ingredients_it = recipe_data.get('ingredients_it', '').split(',')
+        ingredients_it = [i.strip() for i in ingredients_it if i.strip()]
+
+    # Handle instructions as either array or string
+    if isinstance(recipe_data.get('instructions', ''), list):
+        instructions = recipe_data.get('instructions', [])
+    else:
+        instructions = recipe_data.get('instructions', '').split('\n')
+        instructions = [i.strip() for i in instructions if i.strip()]
+
+    if isinstance(recipe_data.get('instructions_it', ''), list):
+        instructions_it = recipe_data.get('instructions_it', [])
+    else:
+        instructions_it = recipe_data.get('instructions_it', '').split('\n')
+        instructions_it = [i.strip() for i in instructions_it if i.strip()]
+
+    vegetarian = recipe_data.get('vegetarian', False)
+    vegan = recipe_data.get('vegan', False)
+    category = recipe_data.get('category', 'quick-meals')
+
+    # If a recipe is vegan, it's also vegetarian
+    if vegan and not vegetarian:
+        vegetarian = True
+
+    # Italian recipes should be in the italian-traditions category
+    if title_it and not category:
+        category = 'italian-traditions'
+
+    # Skip if no title or required fields are missing
+    if not title or not ingredients or not instructions:
+        return None
+
+    return {
+        'title_en': title,
+        'title_it': title_it if title_it else None,
+        'ingredients_en': json.dumps(ingredients),
+        'ingredients_it': json.dumps(ingredients_it) if ingredients_it else None,
+        'instructions_en': json.dumps(instructions),
+        'instructions_it': json.dumps(instructions_it) if instructions_it else None,
+        'vegetarian': vegetarian,
+        'vegan': vegan,
+        'category': category,
+        'image_url': recipe_data.get('image_url', None),
+        'source_url': recipe_data.get('source_url', None),
+    }
+
+
+# (title, content hash) of the recipes already in the database; set by set_known_recipes()
+_known_recipes = frozenset()
+
+
+def set_known_recipes(recipes):
+    """
+    Tell prepare_recipe() which (title, content hash) pairs the database
+    already has, so unchanged recipes skip the ingredient parsing. Also used
+    as the initializer of import worker processes.
+    """
+    global _known_recipes
+    _known_recipes = frozenset(recipes)
+
+
+def prepare_recipe(recipe_data):
+    """
+    Everything the batched writer needs for one raw record, computed without
+    the database: (column values including the title sort keys and content
+    hash, parsed ingredient rows), or None if the record is invalid. The
+    ingredient rows are None for a recipe stored with the same title and hash.
+    """
+    values = normalize_recipe(recipe_data)
+    if values is None:
+        return None
+    values['content_hash'] = content_hash(values)
+    if (values['title_en'], values['content_hash']) in _known_recipes:
+        return values, None
+    return complete_recipe(values)
+
+
+def complete_recipe(values):
+    """Add the title sort keys to normalized values; returns (values, parsed ingredient rows)."""
+    values['sort_key_en'] = title_sort_key(values['title_en'])
+    values['sort_key_it'] = title_sort_key(values['title_it'] or values['title_en'])
+    return values, ingredient_row_mappings(values['ingredients_en'], values['ingredients_it'])
+
+
+def prepare_chunk(chunk):
+    """prepare_recipe() over a list of (number, raw record); the unit of work of an import worker."""
+    return [(number, recipe_data, prepare_recipe(recipe_data)) for number, recipe_data in chunk]
+
+
+def chunked(items, size):
+    """Yield lists of up to size consecutive items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def normalize_recipes(records):
+    """Yield (number, raw record, column values or None if invalid) for each record."""
+    for number, recipe_data in enumerate(records, 1):
+        yield number, recipe_data, normalize_recipe(recipe_data)
+
+
+def recipe_label(recipe_data):
+    """Title of a raw record for log messages."""
+    if isinstance(recipe_data, dict):
+        return recipe_data.get('title') or ''
+    return repr(recipe_data)[:60]
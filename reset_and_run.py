@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 """
 Script to reset the database, import recipes, and start the app.
+
+With --sync the database is kept and brought in line with recipes.json
+instead: new and changed recipes are written, unchanged ones skipped, and
+recipes no longer in the file deleted.
 """
+import argparse
 import os
 import time
 import subprocess
@@ -13,8 +18,11 @@ def reset_database():
     print("Resetting database...")
     try:
         # Delete old database files
-        for db_file in ['recipes.db', 'instance/recipes.db', 'app.db', 'instance/app.db']:
-            if os.path.exists(db_file):
+        for db_name in ['recipes.db', 'instance/recipes.db', 'app.db', 'instance/app.db']:
+            # WAL mode keeps -wal and -shm files next to the database
+            for db_file in [db_name, db_name + '-wal', db_name + '-shm']:
+                if not os.path.exists(db_file):
+                    continue
                 os.remove(db_file)
                 print(f"Removed database file: {db_file}")
         
@@ -33,10 +41,13 @@ def reset_database():
         return False
     return True
 
-def import_recipes():
-    print("Importing recipes...")
+def import_recipes(sync=False):
+    print("Syncing recipes..." if sync else "Importing recipes...")
     # Run the import_recipes.py script
-    result = subprocess.run([sys.executable, 'import_recipes.py'], 
+    command = [sys.executable, 'import_recipes.py', '--bulk']
+    if sync:
+        command.append('--prune')
+    result = subprocess.run(command, 
                             capture_output=True, text=True)
     
     print(result.stdout)
@@ -59,6 +70,11 @@ def run_app():
     subprocess.run([sys.executable, 'app.py'])
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reset the database, import recipes and start the app.")
+    parser.add_argument('--sync', action='store_true',
+                        help="keep the database and sync it with recipes.json instead of resetting it")
+    args = parser.parse_args()
+    
     # Kill any existing Flask processes
     if sys.platform == 'darwin' or sys.platform.startswith('linux'):
         os.system('pkill -f "python3 app.py"')
@@ -67,7 +83,10 @@ if __name__ == "__main__":
     
     time.sleep(1)  # Wait for processes to terminate
     
-    if reset_database():
+    if args.sync:
+        import_recipes(sync=True)
+        run_app()
+    elif reset_database():
         import_recipes()
         run_app()
     else:
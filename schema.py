@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Idempotent schema upgrades for existing databases.
+
+db.create_all() creates missing tables but never changes existing ones, so
+columns and indexes added to existing models are applied here on startup.
+Every step checks what is already there, so running it again (or from several
+workers at once) is harmless.
+"""
+import hashlib
+import json
+import unicodedata
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from ingredient_parser import ingredient_row_mappings
+
+# (table, column, column DDL) added after the table was first created
+COLUMNS = (
+    ('recipe', 'sort_key_en', 'VARCHAR(200)'),
+    ('recipe', 'sort_key_it', 'VARCHAR(200)'),
+    ('recipe', 'content_hash', 'VARCHAR(40)'),
+)
+
+# (index name, table, columns) added after the table was first created
+INDEXES = (
+    ('ix_recipe_sort_key_en', 'recipe', ('sort_key_en', 'id')),
+    ('ix_recipe_sort_key_it', 'recipe', ('sort_key_it', 'id')),
+    ('ix_favorite_session_id', 'favorite', ('session_id', 'recipe_id')),
+)
+
+# Recipe columns covered by the content hash, as stored (JSON text for lists)
+CONTENT_FIELDS = (
+    'title_en', 'title_it', 'ingredients_en', 'ingredients_it', 'instructions_en',
+    'instructions_it', 'vegetarian', 'vegan', 'category', 'image_url', 'source_url',
+)
+
+
+def title_sort_key(title):
+    """Case- and accent-insensitive key for ordering recipes by title."""
+    if not title:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', title.strip().casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))[:200]
+
+
+def content_hash(values):
+    """Hash of a recipe's content columns; equal hashes mean nothing to update."""
+    content = [
+        bool(values.get(field)) if field in ('vegetarian', 'vegan') else values.get(field)
+        for field in CONTENT_FIELDS
+    ]
+    encoded = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def add_missing_columns(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table, column, ddl in COLUMNS:
+        if table not in tables:
+            continue
+        if column in {c['name'] for c in inspector.get_columns(table)}:
+            continue
+        try:
+            connection.execute(text('ALTER TABLE {} ADD COLUMN {} {}'.format(table, column, ddl)))
+        except OperationalError as e:
+            # Another worker added it first
+            if 'duplicate column' not in str(e).lower():
+                raise
+
+
+def create_missing_indexes(connection):
+    for name, table, columns in INDEXES:
+        connection.execute(text('CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+            name, table, ', '.join(columns)
+        )))
+
+
+def backfill_derived_columns(connection):
+    """Fill the sort keys and content hash of recipes written before the columns existed."""
+    rows = connection.execute(text(
+        'SELECT id, {} FROM recipe WHERE sort_key_en IS NULL OR sort_key_it IS NULL '
+        'OR content_hash IS NULL'.format(', '.join(CONTENT_FIELDS))
+    )).mappings().fetchall()
+    if rows:
+        connection.execute(
+            text('UPDATE recipe SET sort_key_en = :en, sort_key_it = :it, content_hash = :hash WHERE id = :id'),
+            [{'id': row['id'], 'en': title_sort_key(row['title_en']),
+              'it': title_sort_key(row['title_it'] or row['title_en']),
+              'hash': content_hash(row)} for row in rows]
+        )
+    return len(rows)
+
+
+def backfill_ingredient_rows(connection, batch_size=500):
+    """
+    Fill the parsed recipe_ingredient rows of recipes stored before the table
+    existed. The importer skips recipes whose content hash is unchanged, so it
+    would never write them.
+    """
+    if 'recipe_ingredient' not in inspect(connection).get_table_names():
+        return 0
+    rows = connection.execute(text(
+        'SELECT id, ingredients_en, ingredients_it FROM recipe '
+        'WHERE id NOT IN (SELECT recipe_id FROM recipe_ingredient)'
+    )).mappings().fetchall()
+    for start in range(0, len(rows), batch_size):
+        mappings = [
+            dict(mapping, recipe_id=row['id'])
+            for row in rows[start:start + batch_size]
+            for mapping in ingredient_row_mappings(row['ingredients_en'], row['ingredients_it'])
+        ]
+        if mappings:
+            connection.execute(text(
+                'INSERT INTO recipe_ingredient (recipe_id, lang, position, quantity, unit, name) '
+                'VALUES (:recipe_id, :lang, :position, :quantity, :unit, :name)'
+            ), mappings)
+    return len(rows)
+
+
+def upgrade_schema(engine):
+    """Bring an existing database up to the current models. Returns the number of rows backfilled."""
+    with engine.begin() as connection:
+        add_missing_columns(connection)
+        create_missing_indexes(connection)
+        return backfill_derived_columns(connection) + backfill_ingredient_rows(connection)
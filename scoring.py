@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Relevance of recipes to an ingredient search.
+
+    score = W_match * match + W_coverage * coverage
+            + W_favorite * favorite + W_popularity * popularity
+
+- match: share of the search terms the recipe has, each term weighted by its
+  inverse document frequency, so staples found in most recipes (salt,
+  pepper, oil) count for little next to rarer ingredients;
+- coverage: share of the recipe's own ingredients the search covers, so a
+  recipe that needs little else ranks above one with a long shopping list;
+- favorite: 1 for the searcher's own favorites;
+- popularity: how many sessions favorited the recipe, log-scaled to 0..1.
+
+Term weights and popularity depend only on the catalog, so they are worked
+out once per catalog version (RelevanceModel.refresh) and looked up per
+search. Every component is a NumPy array over the matching recipes.
+"""
+import hashlib
+import json
+import math
+import threading
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {'match': 0.6, 'coverage': 0.25, 'favorite': 0.1, 'popularity': 0.05}
+
+
+def inverse_document_frequency(frequency, total):
+    """Smoothed IDF: 1 for a key in every recipe, growing as the key gets rarer."""
+    return math.log((total + 1) / (frequency + 1)) + 1.0
+
+
+class Scores:
+    """Score components of the recipes of one IngredientIndex.score() result."""
+
+    __slots__ = ('total', 'match', 'coverage', 'favorite', 'popularity', 'term_weights')
+
+    def __init__(self, total, match, coverage, favorite, popularity, term_weights):
+        self.total = total
+        self.match = match
+        self.coverage = coverage
+        self.favorite = favorite
+        self.popularity = popularity
+        # term -> IDF weight
+        self.term_weights = term_weights
+
+    def breakdown(self, i):
+        """Components of the i-th recipe, for ?explain=true."""
+        return {
+            'score': round(float(self.total[i]), 4),
+            'match': round(float(self.match[i]), 4),
+            'coverage': round(float(self.coverage[i]), 4),
+            'favorite': bool(self.favorite[i]),
+            'popularity': round(float(self.popularity[i]), 4),
+            'term_weights': {term: round(weight, 4) for term, weight in self.term_weights.items()},
+        }
+
+
+class RelevanceModel:
+    """Per-catalog-version weights for ranking search results."""
+
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        # Hash of the weights and favorite counts, the same in every process
+        # given the same inputs; part of the version of cached rankings
+        self.fingerprint = self._fingerprint({})
+        self._lock = threading.Lock()
+        self._popular_ids = np.empty(0, dtype=np.int64)
+        self._popularity = np.empty(0, dtype=np.float64)
+        # (lang, term) -> IDF weight since the last refresh
+        self._term_weights = {}
+
+    def refresh(self, favorite_counts):
+        """Recompute popularity from {recipe_id: number of sessions that favorited it}."""
+        ids = np.array(sorted(favorite_counts), dtype=np.int64)
+        counts = np.array([favorite_counts[recipe_id] for recipe_id in ids.tolist()], dtype=np.float64)
+        popularity = np.log1p(counts)
+        if len(popularity) and popularity.max() > 0:
+            popularity /= popularity.max()
+        with self._lock:
+            self._popular_ids = ids
+            self._popularity = popularity
+            self._term_weights = {}
+            self.fingerprint = self._fingerprint(favorite_counts)
+
+    def _fingerprint(self, favorite_counts):
+        inputs = [sorted(self.weights.items()), sorted(favorite_counts.items())]
+        return hashlib.sha1(json.dumps(inputs).encode('utf-8')).hexdigest()[:12]
+
+    def term_weight(self, index, term, lang):
+        key = (lang, term)
+        weight = self._term_weights.get(key)
+        if weight is None:
+            weight = inverse_document_frequency(index.term_frequency(term, lang), len(index))
+            self._term_weights[key] = weight
+        return weight
+
+    def popularity(self, ids):
+        """Popularity of each recipe id, 0 for recipes nobody favorited."""
+        with self._lock:
+            popular_ids, popularity = self._popular_ids, self._popularity
+        if not len(popular_ids):
+            return np.zeros(len(ids))
+        positions = np.minimum(np.searchsorted(popular_ids, ids), len(popular_ids) - 1)
+        return np.where(popular_ids[positions] == ids, popularity[positions], 0.0)
+
+    def score(self, index, terms, lang, result, favorite_ids=()):
+        """Scores for a TermMatches result of index.score(terms, lang)."""
+        weights = np.array([self.term_weight(index, term, lang) for term in terms])
+        match = result.matched @ weights / weights.sum() if len(weights) else np.zeros(len(result))
+        coverage = np.minimum(result.counts / np.maximum(result.sizes, 1), 1.0)
+        favorite = np.isin(result.ids, np.fromiter(favorite_ids, dtype=np.int64))
+        popularity = self.popularity(result.ids)
+        total = (self.weights['match'] * match + self.weights['coverage'] * coverage
+                 + self.weights['favorite'] * favorite + self.weights['popularity'] * popularity)
+        return Scores(total, match, coverage, favorite, popularity, dict(zip(terms, weights.tolist())))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of ranked search results, keyed by the normalized search and tagged with
+the catalog version, so any recipe write invalidates every entry at once.
+
+Entries hold only ids, match percentages and missing ingredients; anything
+specific to a user (favorites) is added by the caller after the lookup, so one
+entry serves everyone. By default the cache lives in the worker process; with
+a Redis URL the entries are shared by all gunicorn workers.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from logging_config import get_logger
+
+logger = get_logger('search_cache')
+
+
+class SearchCache:
+    """LRU cache of (total, ranked) search results."""
+
+    def __init__(self, max_entries=1024, redis_url=None, ttl=3600, prefix='mealmatch:search'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.hits = 0
+        self.misses = 0
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url)
+            except ImportError:
+                logger.warning("redis package not installed, using the in-process search cache")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _redis_key(self, key, version):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return '{}:{}:{}'.format(self.prefix, version, digest)
+
+    def get(self, key, version):
+        """Cached (total, ranked) for key at this catalog version, or None."""
+        if self._redis is not None:
+            try:
+                value = self._redis.get(self._redis_key(key, version))
+            except Exception as e:
+                logger.warning("Search cache read failed: %s", e)
+                value = None
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            total, ranked = json.loads(value)
+            return total, ranked
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, version, value):
+        """Store (total, ranked) for key at this catalog version."""
+        if self._redis is not None:
+            try:
+                self._redis.setex(self._redis_key(key, version), self.ttl,
+                                  json.dumps(value, separators=(',', ':')))
+            except Exception as e:
+                logger.warning("Search cache write failed: %s", e)
+            return
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory ingredient index used to score recipes against a search.
+
+Every distinct ingredient key (a parsed ingredient name, or its English
+dictionary entry) gets a column in a per-language vocabulary, and every recipe
+a row of bits over that vocabulary, packed into a NumPy ``uint64`` matrix.
+A search term is resolved once into the mask of vocabulary keys it stands
+for: keys holding every word of the term, or whose words all appear in the
+term ("sea salt" and "salt" match either way). Words are compared whole, with
+plurals and typos resolved by fuzzy_match.FuzzyResolver, so "egg" finds
+"eggs" but not "eggplant", and "tomatos" finds "tomatoes". A term with an
+English dictionary entry also matches that entry ("parmigiano" ->
+"parmesan"). Scoring a search is then an AND of each term's mask against the
+matrix, for all recipes at once.
+Ingredients are compared by their parsed names, so quantities and units
+("350g", "2 tbsp") never match a search term.
+
+The matrix takes recipes x vocabulary / 8 bytes per language; only the
+columns a search touches are read.
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fuzzy_match import FuzzyResolver, plural_stem
+from ingredient_parser import find_canonical, parse_ingredient
+
+LANGUAGES = ('en', 'it')
+
+# Runs of letters (accented ones included); digits and punctuation split tokens
+_TOKEN_RE = re.compile(r"[^\W\d_]+")
+
+_WORD_BITS = 64
+
+# Score of keys matched through a term's English dictionary entry rather than the term
+CANONICAL_SCORE = 0.9
+
+# Resolved search terms and pantry items kept per language
+TERM_CACHE_SIZE = 4096
+
+
+def tokenize(text):
+    """Return the set of lowercase word tokens found in text."""
+    return set(_TOKEN_RE.findall(text.lower()))
+
+
+def ingredient_entries(ingredients):
+    """(parsed name, English dictionary entry or None) of each distinct ingredient of a recipe."""
+    entries = {}
+    for text in ingredients:
+        parsed = parse_ingredient(text)
+        name = parsed.name or text.lower().strip()
+        if name not in entries:
+            entries[name] = parsed.canonical
+    return tuple(entries.items())
+
+
+def _entry_keys(entries):
+    keys = []
+    for name, canonical in entries:
+        if name not in keys:
+            keys.append(name)
+        if canonical and canonical not in keys:
+            keys.append(canonical)
+    return keys
+
+
+def ingredient_keys(ingredients):
+    """
+    The strings a recipe's ingredients are matched on: each parsed name, plus
+    its English dictionary entry so translated searches match in both languages.
+    """
+    return tuple(_entry_keys(ingredient_entries(ingredients)))
+
+
+def _stems(text):
+    return {plural_stem(token) for token in tokenize(text)}
+
+
+def _load_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def _bit(column):
+    return np.uint64(1) << np.uint64(column % _WORD_BITS)
+
+
+class TermMatches:
+    """Result of IngredientIndex.score() for one search."""
+
+    __slots__ = ('ids', 'matched', 'sizes')
+
+    def __init__(self, ids, matched, sizes):
+        # ids: recipe ids matching at least one term
+        self.ids = ids
+        # matched[i, j]: recipe ids[i] has an ingredient matching term j
+        self.matched = matched
+        # sizes[i]: number of distinct ingredients of recipe ids[i]
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def counts(self):
+        """Number of matched terms per recipe."""
+        return self.matched.sum(axis=1)
+
+
+class PantryMatches:
+    """Result of IngredientIndex.pantry(): recipes by fewest missing ingredients."""
+
+    __slots__ = ('ids', 'missing', 'sizes', '_index', '_lang', '_names')
+
+    def __init__(self, ids, missing, sizes, index=None, lang='en', names=frozenset()):
+        self.ids = ids
+        # missing[i]: ingredients of recipe ids[i] the pantry does not cover
+        self.missing = missing
+        # sizes[i]: number of distinct ingredients of recipe ids[i]
+        self.sizes = sizes
+        self._index = index
+        self._lang = lang
+        self._names = names
+
+    def __len__(self):
+        return len(self.ids)
+
+    def missing_ingredients(self, recipe_id):
+        """Names of the ingredients of a recipe the pantry does not cover."""
+        return self._index.uncovered_names(recipe_id, self._names, self._lang)
+
+
+class _TermCache:
+    """LRU cache of what a search term resolves to; callers hold the index lock."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, term):
+        value = self._entries.get(term)
+        if value is not None:
+            self._entries.move_to_end(term)
+        return value
+
+    def set(self, term, value):
+        self._entries[term] = value
+        self._entries.move_to_end(term)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class _Vocabulary:
+    """Ingredient keys of one language and the recipe bit matrix over them."""
+
+    def __init__(self, row_capacity, fuzzy_budget):
+        self.keys = []
+        self.columns = {}
+        # column -> frozenset of the key's tokens
+        self.key_tokens = []
+        # token -> columns of the keys containing it
+        self.token_columns = {}
+        self.resolver = FuzzyResolver(fuzzy_budget)
+        # (words, rows) matrix; bit c of word c // 64 is set when the row has key c
+        self.bits = np.zeros((1, row_capacity), dtype=np.uint64)
+        # row -> columns set in it, to clear it again
+        self.row_columns = {}
+        # column -> number of recipes with the key
+        self.frequencies = np.zeros(_WORD_BITS, dtype=np.int64)
+        # row -> number of distinct ingredients of the recipe
+        self.sizes = np.zeros(row_capacity, dtype=np.int32)
+        # Inverted index of ingredient names for pantry searches:
+        # name column -> rows with that ingredient, row -> its name columns,
+        # and dictionary entry column -> name columns it is a translation of
+        self.name_rows = {}
+        self.row_names = {}
+        self.entry_names = {}
+        # name column -> name_rows as an array, until the set changes
+        self._name_arrays = {}
+        # term -> (ranked (column, score), word indexes, masks) of the keys it matches
+        self._aliases = _TermCache(TERM_CACHE_SIZE)
+        # pantry item -> columns of the keys it covers
+        self._pantry_columns = _TermCache(TERM_CACHE_SIZE)
+
+    def column(self, key):
+        """Column of key, added to the vocabulary if new."""
+        column = self.columns.get(key)
+        if column is not None:
+            return column
+        column = len(self.keys)
+        self.keys.append(key)
+        self.columns[key] = column
+        tokens = frozenset(tokenize(key))
+        self.key_tokens.append(tokens)
+        for token in tokens:
+            if token not in self.token_columns:
+                self.token_columns[token] = set()
+                self.resolver.add(token)
+            self.token_columns[token].add(column)
+        if column // _WORD_BITS >= self.bits.shape[0]:
+            self.bits = np.vstack([self.bits, np.zeros_like(self.bits)])
+            self.frequencies = np.concatenate([self.frequencies, np.zeros_like(self.frequencies)])
+        self._aliases.clear()
+        self._pantry_columns.clear()
+        return column
+
+    def grow_rows(self, row_capacity):
+        grown = np.zeros((self.bits.shape[0], row_capacity), dtype=np.uint64)
+        grown[:, :self.bits.shape[1]] = self.bits
+        self.bits = grown
+        self.sizes = np.concatenate([self.sizes, np.zeros(row_capacity - len(self.sizes), dtype=np.int32)])
+
+    def set_row(self, row, entries):
+        self.clear_row(row)
+        columns = tuple(self.column(key) for key in _entry_keys(entries))
+        for column in columns:
+            self.bits[column // _WORD_BITS, row] |= _bit(column)
+            self.frequencies[column] += 1
+        self.row_columns[row] = columns
+        self._set_names(row, entries)
+
+    def set_rows(self, rows, entries_per_row):
+        """set_row() for many fresh rows at once."""
+        pairs = []
+        for row, entries in zip(rows, entries_per_row):
+            columns = tuple(self.column(key) for key in _entry_keys(entries))
+            self.row_columns[row] = columns
+            self._set_names(row, entries)
+            pairs.extend((column, row) for column in columns)
+        if pairs:
+            columns, rows = np.array(pairs, dtype=np.int64).T
+            np.bitwise_or.at(self.bits, (columns // _WORD_BITS, rows),
+                             np.uint64(1) << (columns % _WORD_BITS).astype(np.uint64))
+            np.add.at(self.frequencies, columns, 1)
+
+    def _set_names(self, row, entries):
+        names = []
+        for name, canonical in entries:
+            column = self.column(name)
+            names.append(column)
+            self.name_rows.setdefault(column, set()).add(row)
+            self._name_arrays.pop(column, None)
+            # An entry naming only part of the ingredient ("eggs" for "egg noodles") does not cover it
+            if canonical and canonical != name and not _stems(canonical) < _stems(name):
+                self.entry_names.setdefault(self.column(canonical), set()).add(column)
+        self.row_names[row] = tuple(names)
+        self.sizes[row] = len(names)
+
+    def clear_row(self, row):
+        for column in self.row_columns.pop(row, ()):
+            self.bits[column // _WORD_BITS, row] &= ~_bit(column)
+            self.frequencies[column] -= 1
+        for column in self.row_names.pop(row, ()):
+            self.name_rows[column].discard(row)
+            self._name_arrays.pop(column, None)
+        self.sizes[row] = 0
+
+    def name_postings(self, column):
+        """Rows with the ingredient name, as an int64 array."""
+        rows = self._name_arrays.get(column)
+        if rows is None:
+            rows = np.fromiter(self.name_rows[column], dtype=np.int64, count=len(self.name_rows[column]))
+            self._name_arrays[column] = rows
+        return rows
+
+    def pantry_columns(self, term):
+        """Columns of the keys a pantry item covers: the keys contained in it; cached per item."""
+        columns = self._pantry_columns.get(term)
+        if columns is None:
+            timeouts = self.resolver.timeouts
+            columns = tuple(column for column, _ in self.resolve(term, within=True))
+            # Typo corrections cut short by the time budget are retried next time
+            if self.resolver.timeouts == timeouts:
+                self._pantry_columns.set(term, columns)
+        return columns
+
+    def covered_names(self, terms):
+        """Name columns of the ingredients pantry items cover, directly or by dictionary entry."""
+        names = set()
+        for term in terms:
+            for column in self.pantry_columns(term):
+                if column in self.name_rows:
+                    names.add(column)
+                names |= self.entry_names.get(column, set())
+        return names
+
+    def _phrase_columns(self, phrase, within=False):
+        """
+        {column: score} of the keys phrase matches, word by word. With within,
+        only keys contained in the phrase: "sea salt" matches "salt" but "salt"
+        does not match "sea salt".
+        """
+        words = tokenize(phrase)
+        if not words:
+            # No letters ("2"): plain substring test
+            return {c: 1.0 for c, key in enumerate(self.keys) if key in phrase or (not within and phrase in key)}
+        resolved = [dict(self.resolver.resolve(word)) for word in words]
+        scores = {}
+        if not within:
+            # Phrase in key: every word of the phrase is one of the key's tokens
+            columns = None
+            for tokens in resolved:
+                word_columns = set()
+                for token in tokens:
+                    word_columns |= self.token_columns[token]
+                columns = word_columns if columns is None else columns & word_columns
+            for column in columns:
+                key_tokens = self.key_tokens[column]
+                scores[column] = min(max(s for t, s in tokens.items() if t in key_tokens) for tokens in resolved)
+        # Key in phrase: every token of the key stands for a word of the phrase
+        best = {}
+        for tokens in resolved:
+            for token, score in tokens.items():
+                best[token] = max(score, best.get(token, 0.0))
+        for token in best:
+            for column in self.token_columns[token]:
+                key_tokens = self.key_tokens[column]
+                if column not in scores and key_tokens <= best.keys():
+                    scores[column] = min(best[t] for t in key_tokens)
+        return scores
+
+    def resolve(self, term, within=False):
+        """Ranked (column, score) of the keys term matches (see _phrase_columns)."""
+        scores = self._phrase_columns(term, within)
+        canonical = find_canonical(term)
+        # Skip entries that only drop words of the term ("chicken breast" -> "chicken")
+        if canonical and canonical != term and not tokenize(canonical) < tokenize(term):
+            for column, score in self._phrase_columns(canonical, within).items():
+                scores[column] = max(score * CANONICAL_SCORE, scores.get(column, 0.0))
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def aliases(self, term):
+        """(ranked (column, score), word indexes, uint64 masks) of the keys term matches; cached per term."""
+        cached = self._aliases.get(term)
+        if cached is None:
+            timeouts = self.resolver.timeouts
+            ranked = self.resolve(term)
+            masks = {}
+            for column, _ in ranked:
+                word = column // _WORD_BITS
+                masks[word] = masks.get(word, np.uint64(0)) | _bit(column)
+            words = np.array(sorted(masks), dtype=np.int64)
+            cached = (ranked, words, np.array([masks[w] for w in words.tolist()], dtype=np.uint64))
+            if self.resolver.timeouts == timeouts:
+                self._aliases.set(term, cached)
+        return cached
+
+
+class IngredientIndex:
+    """Recipes as packed ingredient bitsets, per language, for vectorized scoring."""
+
+    def __init__(self, fuzzy_budget=0.005):
+        # Seconds a typo correction may spend per search word
+        self.fuzzy_budget = fuzzy_budget
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+
+    def _reset(self, capacity=64):
+        # recipe id -> matrix row, and the reverse (-1 for free rows)
+        self._rows = {}
+        self._row_ids = np.full(capacity, -1, dtype=np.int64)
+        self._vegetarian = np.zeros(capacity, dtype=bool)
+        self._free_rows = []
+        self._row_count = 0
+        self._vocabularies = {lang: _Vocabulary(capacity, self.fuzzy_budget) for lang in LANGUAGES}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def build(self, rows):
+        """
+        Rebuild the index from (id, vegetarian, ingredients_en, ingredients_it)
+        rows, where the ingredient columns hold the raw JSON text.
+        """
+        with self._lock:
+            parsed = [
+                (recipe_id, vegetarian, self._keys_per_lang(ingredients_en, ingredients_it))
+                for recipe_id, vegetarian, ingredients_en, ingredients_it in rows
+            ]
+            self._reset(max(64, len(parsed)))
+            for row, (recipe_id, vegetarian, _) in enumerate(parsed):
+                self._rows[recipe_id] = row
+                self._row_ids[row] = recipe_id
+                self._vegetarian[row] = bool(vegetarian)
+            self._row_count = len(parsed)
+            for lang, vocabulary in self._vocabularies.items():
+                vocabulary.set_rows(range(len(parsed)), [keys[lang] for _, _, keys in parsed])
+            self.ready = True
+
+    def add(self, recipe_id, vegetarian, ingredients_en, ingredients_it=None):
+        """Index (or re-index) a single recipe."""
+        keys = self._keys_per_lang(ingredients_en, ingredients_it)
+        with self._lock:
+            row = self._rows.get(recipe_id)
+            if row is None:
+                row = self._new_row()
+                self._rows[recipe_id] = row
+                self._row_ids[row] = recipe_id
+            self._vegetarian[row] = bool(vegetarian)
+            for lang, vocabulary in self._vocabularies.items():
+                vocabulary.set_row(row, keys[lang])
+
+    def remove(self, recipe_id):
+        """Drop a recipe from the index."""
+        with self._lock:
+            row = self._rows.pop(recipe_id, None)
+            if row is None:
+                return
+            for vocabulary in self._vocabularies.values():
+                vocabulary.clear_row(row)
+            self._row_ids[row] = -1
+            self._vegetarian[row] = False
+            self._free_rows.append(row)
+
+    @staticmethod
+    def _keys_per_lang(ingredients_en, ingredients_it):
+        """{lang: ingredient_entries()} of a recipe."""
+        ingredients_en = _load_list(ingredients_en)
+        # Italian searches fall back to the English list, like Recipe.get_ingredients
+        return {
+            'en': ingredient_entries(ingredients_en),
+            'it': ingredient_entries(_load_list(ingredients_it) or ingredients_en),
+        }
+
+    def _new_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = self._row_count
+        if row >= len(self._row_ids):
+            capacity = 2 * len(self._row_ids)
+            self._row_ids = np.concatenate([self._row_ids, np.full(capacity - len(self._row_ids), -1, dtype=np.int64)])
+            self._vegetarian = np.concatenate([self._vegetarian, np.zeros(capacity - len(self._vegetarian), dtype=bool)])
+            for vocabulary in self._vocabularies.values():
+                vocabulary.grow_rows(capacity)
+        self._row_count += 1
+        return row
+
+    def score(self, terms, lang='en', vegetarian_only=False):
+        """
+        TermMatches for the (lowercased) search terms: every recipe with at
+        least one ingredient matching one of them, and which terms it matches.
+        """
+        if lang not in LANGUAGES:
+            lang = 'en'
+        terms = list(terms)
+        with self._lock:
+            vocabulary = self._vocabularies[lang]
+            rows = self._row_count
+            aliases = [vocabulary.aliases(term) for term in terms]
+            words = np.unique(np.concatenate([w for _, w, _ in aliases] + [np.empty(0, dtype=np.int64)]))
+            # Only the words some term touches are read
+            bits = vocabulary.bits[words, :rows]
+            matched = np.zeros((len(terms), rows), dtype=bool)
+            for j, (_, term_words, masks) in enumerate(aliases):
+                if len(term_words):
+                    selected = bits[np.searchsorted(words, term_words)]
+                    matched[j] = (selected & masks[:, None]).any(axis=0)
+            keep = matched.any(axis=0) & (self._row_ids[:rows] >= 0)
+            if vegetarian_only:
+                keep &= self._vegetarian[:rows]
+            found = np.flatnonzero(keep)
+            return TermMatches(self._row_ids[found], matched[:, found].T, vocabulary.sizes[found])
+
+    def resolve(self, term, lang='en'):
+        """The ingredient keys a search term matches, as (key, score) with the best first."""
+        if lang not in LANGUAGES:
+            lang = 'en'
+        with self._lock:
+            vocabulary = self._vocabularies[lang]
+            return [(vocabulary.keys[column], score) for column, score in vocabulary.aliases(term)[0]]
+
+    def term_frequency(self, term, lang='en'):
+        """Number of recipes with the most common ingredient key term matches."""
+        if lang not in LANGUAGES:
+            lang = 'en'
+        with self._lock:
+            vocabulary = self._vocabularies[lang]
+            columns = [column for column, _ in vocabulary.aliases(term)[0]]
+            return int(vocabulary.frequencies[columns].max()) if columns else 0
+
+    def pantry(self, terms, lang='en', max_missing=0, vegetarian_only=False):
+        """
+        Recipes whose distinct ingredients the pantry terms cover, all of them
+        or all but max_missing, fewest missing first, then the recipes using
+        the most pantry ingredients, then by id. Counters are kept only for the
+        recipes the inverted index reaches from the covered ingredients, so
+        recipes sharing nothing with the pantry are never looked at.
+        """
+        if lang not in LANGUAGES:
+            lang = 'en'
+        with self._lock:
+            vocabulary = self._vocabularies[lang]
+            names = frozenset(vocabulary.covered_names(terms))
+            postings = [vocabulary.name_postings(column) for column in names if vocabulary.name_rows[column]]
+            if not postings:
+                empty = np.empty(0, dtype=np.int64)
+                return PantryMatches(empty, empty, empty)
+            rows = np.concatenate(postings)
+            # One counter per reached recipe: how many of its ingredients are covered
+            rows, covered = np.unique(rows, return_counts=True)
+            sizes = vocabulary.sizes[rows].astype(np.int64)
+            missing = sizes - covered
+            keep = missing <= max_missing
+            if vegetarian_only:
+                keep &= self._vegetarian[rows]
+            rows, missing, sizes = rows[keep], missing[keep], sizes[keep]
+            ids = self._row_ids[rows]
+            order = np.lexsort((ids, -(sizes - missing), missing))
+            return PantryMatches(ids[order], missing[order], sizes[order], self, lang, names)
+
+    def uncovered_names(self, recipe_id, names, lang='en'):
+        """Ingredient names of a recipe outside a set of name columns."""
+        with self._lock:
+            vocabulary = self._vocabularies[lang]
+            row = self._rows.get(recipe_id)
+            if row is None:
+                return []
+            return [vocabulary.keys[column] for column in vocabulary.row_names.get(row, ())
+                    if column not in names]
+
+
+def recipe_categories(category, title_it, vegetarian, vegan):
+    """
+    Catalog categories a recipe is listed under, following the ricettario
+    filters: vegetarian/vegan by flag, italian-traditions by category or an
+    Italian title, and any other category by the category column.
+    """
+    categories = set()
+    if vegetarian:
+        categories.add('vegetarian')
+    if vegan:
+        categories.add('vegan')
+    if category == 'italian-traditions' or title_it is not None:
+        categories.add('italian-traditions')
+    if category and category not in ('vegetarian', 'vegan'):
+        categories.add(category)
+    return categories
+
+
+class CategoryIndex:
+    """Recipe ids per catalog category, so membership and counts are O(1) reads."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._members = {}
+        self._categories = {}
+
+    @property
+    def total(self):
+        return len(self._categories)
+
+    def build(self, rows):
+        """Rebuild from (id, category, title_it, vegetarian, vegan) rows."""
+        with self._lock:
+            self._members = {}
+            self._categories = {}
+            for recipe_id, category, title_it, vegetarian, vegan in rows:
+                self._add(recipe_id, recipe_categories(category, title_it, vegetarian, vegan))
+
+    def add(self, recipe_id, category, title_it, vegetarian, vegan):
+        """Index (or re-index) a single recipe."""
+        with self._lock:
+            self._remove(recipe_id)
+            self._add(recipe_id, recipe_categories(category, title_it, vegetarian, vegan))
+
+    def remove(self, recipe_id):
+        with self._lock:
+            self._remove(recipe_id)
+
+    def _add(self, recipe_id, categories):
+        self._categories[recipe_id] = categories
+        for category in categories:
+            self._members.setdefault(category, set()).add(recipe_id)
+
+    def _remove(self, recipe_id):
+        for category in self._categories.pop(recipe_id, ()):
+            members = self._members.get(category)
+            if members is not None:
+                members.discard(recipe_id)
+
+    def count(self, category):
+        return len(self._members.get(category, ()))
+
+    def members(self, category):
+        return frozenset(self._members.get(category, ()))
+
+    def counts(self):
+        """{category: number of recipes} for every category with recipes."""
+        with self._lock:
+            return {category: len(ids) for category, ids in self._members.items()}
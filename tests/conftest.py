@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+import pytest
+
+# The app binds its database when imported, so point it at a scratch file first
+_db_dir = tempfile.mkdtemp(prefix='recipe-finder-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'recipes.db')
+
+import app as recipe_app  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    recipe_app.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return recipe_app.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def add_recipe(client):
+    """Add a recipe through the API and return its JSON."""
+    def add(title, ingredients, **fields):
+        payload = dict({
+            'title_en': title,
+            'ingredients_en': ingredients,
+            'instructions_en': ['Cook it.'],
+        }, **fields)
+        response = client.post('/api/recipes/add', json=payload)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['recipe']
+    return add
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import app as recipe_app
+
+
+def test_search_sees_recipe_added_by_same_worker(client, add_recipe):
+    assert client.get('/api/recipes?ingredients=kale').status_code == 404
+
+    recipe = add_recipe('Kale salad', ['2 cups kale', '1 lemon'])
+
+    response = client.get('/api/recipes?ingredients=kale')
+    assert response.status_code == 200
+    assert recipe['id'] in [result['id'] for result in response.get_json()]
+
+
+def test_write_bumps_worker_catalog_version(client, add_recipe):
+    before = recipe_app.catalog_state['version']
+    etag = client.get('/ricettario').headers['ETag']
+
+    add_recipe('Chard soup', ['1 bunch chard', '1 onion'])
+
+    assert recipe_app.catalog_state['version'] == before + 1
+    assert client.get('/ricettario', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_change_log_is_trimmed_and_lagging_worker_rebuilds(app, add_recipe, monkeypatch):
+    monkeypatch.setitem(app.config, 'CATALOG_CHANGE_RETENTION', 2)
+    recipes = [add_recipe('Fennel bake {}'.format(n), ['1 fennel bulb']) for n in range(3)]
+    version = recipe_app.catalog_state['version']
+
+    with app.app_context():
+        logged = {row.version for row in recipe_app.CatalogChange.query}
+    assert logged == {version - 1, version}
+
+    # A worker that last synced before the trimmed versions cannot replay them
+    rebuilds = []
+    load_catalog_indexes = recipe_app.load_catalog_indexes
+    monkeypatch.setattr(recipe_app, 'load_catalog_indexes', lambda: rebuilds.append(1) or load_catalog_indexes())
+    recipe_app.ingredient_index.remove(recipes[0]['id'])
+    recipe_app.catalog_state['version'] = version - 3
+    with app.app_context():
+        recipe_app.sync_catalog(force=True)
+
+    assert rebuilds == [1]
+    assert recipe_app.catalog_state['version'] == version
+    assert recipes[0]['id'] in recipe_app.ingredient_index.score(['fennel']).ids.tolist()
+
+
+def test_importing_the_app_does_not_build_the_indexes(tmp_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///{}'.format(tmp_path / 'scripts.db'))
+    output = subprocess.run(
+        [sys.executable, '-c', 'import app; print(app.ingredient_index.ready)'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip().splitlines()[-1] == 'False'
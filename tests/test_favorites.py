@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+
+def test_batch_adds_and_removes(client, add_recipe):
+    first = add_recipe('Jicama salad', ['1 jicama'])['id']
+    second = add_recipe('Jicama chips', ['1 jicama', '1 tbsp oil'])['id']
+    third = add_recipe('Jicama slaw', ['1 jicama', '1 lime'])['id']
+
+    response = client.post('/api/favorites/batch', json={'add': [third, first, second]})
+    assert response.status_code == 200
+    assert response.get_json() == {'favorites': sorted([first, second, third]), 'unknown': []}
+
+    response = client.post('/api/favorites/batch', json={'remove': [second]})
+    assert response.get_json()['favorites'] == sorted([first, third])
+
+
+def test_batch_leaves_existing_favorites_alone(client, add_recipe):
+    recipe_id = add_recipe('Salsify gratin', ['2 salsify roots'])['id']
+    client.post('/api/favorites/batch', json={'add': [recipe_id]})
+
+    # Adding it again does not fail the batch or duplicate the favorite
+    response = client.post('/api/favorites/batch', json={'add': [recipe_id, recipe_id]})
+    assert response.status_code == 200
+    assert response.get_json()['favorites'] == [recipe_id]
+
+
+def test_batch_removal_wins_and_unknown_ids_are_reported(client, add_recipe):
+    kept = add_recipe('Kohlrabi slaw', ['1 kohlrabi'])['id']
+    dropped = add_recipe('Kohlrabi fritters', ['1 kohlrabi', '1 egg'])['id']
+    missing = dropped + 100000
+
+    response = client.post('/api/favorites/batch',
+                           json={'add': [kept, dropped, missing], 'remove': [dropped]})
+    assert response.get_json() == {'favorites': [kept], 'unknown': [missing]}
+
+
+def test_batch_favorites_are_per_session(app, add_recipe):
+    recipe_id = add_recipe('Chard pie', ['1 bunch chard'])['id']
+    app.test_client().post('/api/favorites/batch', json={'add': [recipe_id]})
+
+    response = app.test_client().post('/api/favorites/batch', json={'add': []})
+    assert response.get_json()['favorites'] == []
+
+
+def test_batch_rejects_bad_payloads(client):
+    assert client.post('/api/favorites/batch', json=[1, 2]).status_code == 400
+    assert client.post('/api/favorites/batch', json={'add': 'x'}).status_code == 400
+    assert client.post('/api/favorites/batch', json={'add': ['1']}).status_code == 400
+    assert client.post('/api/favorites/batch', json={'remove': [True]}).status_code == 400
+
+
+def test_batch_size_limit(app, client):
+    limit = app.config['FAVORITES_BATCH_MAX']
+    response = client.post('/api/favorites/batch',
+                           json={'add': list(range(1, limit + 1)), 'remove': [limit + 1]})
+    assert response.status_code == 400
+    assert str(limit) in response.get_json()['error']
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from fuzzy_match import FuzzyResolver
+from search_index import IngredientIndex
+
+
+def test_corrections_cut_short_are_not_cached():
+    resolver = FuzzyResolver(budget=-1)
+    resolver.add('tomatoes')
+    assert resolver.resolve('tomstoes') == ()
+    assert resolver.timeouts == 1
+
+    resolver.budget = 1.0
+    assert [token for token, _ in resolver.resolve('tomstoes')] == ['tomatoes']
+    assert resolver.timeouts == 1
+
+
+def test_resolution_cache_is_bounded():
+    resolver = FuzzyResolver(max_entries=2)
+    resolver.add('egg')
+    for word in ('egg', 'eggs', 'milk', 'flour'):
+        resolver.resolve(word)
+    assert list(resolver._cache) == ['milk', 'flour']
+
+
+def test_index_retries_terms_resolved_past_the_budget():
+    index = IngredientIndex(fuzzy_budget=-1)
+    index.build([(1, False, '["2 tomatoes"]', None)])
+    assert index.resolve('tomstoes') == []
+
+    index._vocabularies['en'].resolver.budget = 1.0
+    assert [key for key, _ in index.resolve('tomstoes')] == ['tomatoes']
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from flask import url_for
+
+import http_cache
+
+
+def test_search_setting_session_cookie_is_not_public(client, add_recipe):
+    add_recipe('Leek tart', ['2 leeks', '1 pastry sheet'])
+
+    response = client.get('/api/recipes?ingredients=leek&lang=en')
+    assert response.status_code == 200
+    assert 'Set-Cookie' in response.headers
+    assert response.headers['Cache-Control'].startswith('private')
+
+    # Same language again: the session is unchanged, so the answer can be shared
+    response = client.get('/api/recipes?ingredients=leek&lang=en')
+    assert 'Set-Cookie' not in response.headers
+    assert response.headers['Cache-Control'].startswith('public')
+
+
+def test_only_current_static_fingerprint_is_immutable(app, client):
+    with app.test_request_context():
+        url = url_for('static', filename='css/style.css')
+    assert 'v=' in url
+    assert client.get(url).headers['Cache-Control'] == http_cache.IMMUTABLE
+
+    for stale in ('/static/css/style.css?v=000000000000', '/static/css/missing.css?v=abc', '/no-such-page?v=abc'):
+        assert client.get(stale).headers['Cache-Control'] == http_cache.REVALIDATE
+
+
+def test_page_etags_change_with_the_build(app, client, monkeypatch):
+    etag = client.get('/ricettario').headers['ETag']
+    assert client.get('/ricettario', headers={'If-None-Match': etag}).status_code == 304
+
+    monkeypatch.setitem(app.config, 'BUILD_TOKEN', 'next-deploy')
+    assert client.get('/ricettario', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_build_token_hashes_file_contents(tmp_path):
+    (tmp_path / 'page.html').write_text('one')
+    token = http_cache.build_token(str(tmp_path))
+    assert http_cache.build_token(str(tmp_path)) == token
+    (tmp_path / 'page.html').write_text('two')
+    assert http_cache.build_token(str(tmp_path)) != token
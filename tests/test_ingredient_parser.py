@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from ingredient_parser import (find_canonical, format_ingredient, ingredient_row_mappings, normalize_name,
+                               parse_ingredient, parse_quantity)
+
+
+@pytest.mark.parametrize('text, quantity, unit, name', [
+    ('350g flour', 350.0, 'g', 'flour'),
+    ('2 tbsp olive oil', 2.0, 'tbsp', 'olive oil'),
+    ('1/2 onion, finely chopped', 0.5, None, 'onion'),
+    ('1,5 litri di latte', 1.5, 'l', 'latte'),
+    ('2-3 large eggs', 2.0, None, 'eggs'),
+    ('2 spicchi d\'aglio', 2.0, 'cloves', 'aglio'),
+    ('salt to taste', None, 'to taste', 'salt'),
+    ('Pecorino Romano (grated)', None, None, 'pecorino romano'),
+])
+def test_parse_ingredient(text, quantity, unit, name):
+    parsed = parse_ingredient(text)
+    assert (parsed.quantity, parsed.unit, parsed.name) == (quantity, unit, name)
+
+
+@pytest.mark.parametrize('text, quantity, unit, name, quantity_text', [
+    ('1 1/2 cups flour', 1.5, 'cup', 'flour', '1 1/2'),
+    ('1 1/2cups flour', 1.5, 'cup', 'flour', '1 1/2'),
+    ('2 ½ tbsp sugar', 2.5, 'tbsp', 'sugar', '2 ½'),
+])
+def test_mixed_numbers(text, quantity, unit, name, quantity_text):
+    parsed = parse_ingredient(text)
+    assert (parsed.quantity, parsed.unit, parsed.name, parsed.quantity_text) == (quantity, unit, name, quantity_text)
+
+
+@pytest.mark.parametrize('text, quantity', [('½ cup milk', 0.5), ('1½ cups milk', 1.5), ('¾ cup milk', 0.75)])
+def test_unicode_fractions(text, quantity):
+    parsed = parse_ingredient(text)
+    assert (parsed.quantity, parsed.unit, parsed.name) == (quantity, 'cup', 'milk')
+
+
+def test_format_ingredient_translates_unit_and_name():
+    assert format_ingredient(parse_ingredient('1 1/2 cups flour'), 'it') == '1 1/2 tazza farina'
+    assert format_ingredient(parse_ingredient('350g flour'), 'it') == '350g farina'
+
+
+def test_parse_quantity():
+    assert parse_quantity('1,5') == 1.5
+    assert parse_quantity('1 1/2') == 1.5
+    assert parse_quantity('1/0') is None
+    assert parse_quantity('abc') is None
+
+
+def test_names_and_dictionary_entries():
+    assert normalize_name('Fresh Basil (a handful), torn') == 'basil'
+    assert find_canonical('aglio') == 'garlic'
+    assert find_canonical('tomato') == 'tomatoes'
+    rows = ingredient_row_mappings(json.dumps(['2 eggs', '']), json.dumps(['2 uova']))
+    assert [(row['lang'], row['name']) for row in rows] == [('en', 'eggs'), ('it', 'uova')]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import app as recipe_app
+from pagination import decode_cursor, encode_cursor, list_page
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor('crème brûlée', 42)) == ('crème brûlée', 42)
+    assert decode_cursor(encode_cursor(-3.5, 7)) == (-3.5, 7)
+    assert '=' not in encode_cursor('a', 1)
+
+
+@pytest.mark.parametrize('cursor', [
+    None, '', 'not base64!', 'e30',  # {}
+    encode_cursor('a', 1)[:-2],
+    encode_cursor(['a'], 1), encode_cursor('a', 'b'),
+])
+def test_malformed_cursors_are_ignored(cursor):
+    assert decode_cursor(cursor) is None
+
+
+KEYS = [[-0.9, 4], [-0.5, 2], [-0.5, 7], [-0.1, 1], [0.0, 3]]
+
+
+def test_list_page_forward_and_back():
+    first = list_page(KEYS, 2)
+    assert first.items == [4, 2]
+    assert (first.has_prev, first.has_next, first.total) == (False, True, 5)
+
+    second = list_page(KEYS, 2, after=first.next_cursor)
+    assert second.items == [7, 1]
+    last = list_page(KEYS, 2, after=second.next_cursor)
+    assert last.items == [3]
+    assert not last.has_next
+
+    back = list_page(KEYS, 2, before=last.prev_cursor)
+    assert back.items == second.items
+    assert list_page(KEYS, 2, before=back.prev_cursor).items == first.items
+    assert not list_page(KEYS, 2, before=back.prev_cursor).has_prev
+
+
+def test_list_page_ignores_cursors_of_the_other_listing():
+    page = list_page(KEYS, 2, after=encode_cursor('title', 4))
+    assert page.items == [4, 2]
+    assert not page.has_prev
+
+
+def test_keyset_page_walks_the_catalog_both_ways(app, add_recipe):
+    ids = [add_recipe('Romanesco {}'.format(name), ['1 romanesco'])['id']
+           for name in ('pasta', 'fritters', 'soup', 'bake', 'salad')]
+
+    with app.test_request_context():
+        pages = [recipe_app.browse_catalog('romanesco', None, 'en', per_page=2)]
+        while pages[-1].has_next:
+            pages.append(recipe_app.browse_catalog('romanesco', None, 'en', per_page=2,
+                                                   after=pages[-1].next_cursor))
+        titles = [recipe.title_en for page in pages for recipe in page.items]
+        assert titles == sorted(titles)
+        assert sorted(recipe.id for page in pages for recipe in page.items) == sorted(ids)
+        assert [len(page.items) for page in pages] == [2, 2, 1]
+
+        back = recipe_app.browse_catalog('romanesco', None, 'en', per_page=2,
+                                         before=pages[2].prev_cursor)
+        assert [recipe.id for recipe in back.items] == [recipe.id for recipe in pages[1].items]
+        assert back.has_prev and back.has_next
+
+
+def test_stale_cursor_redirects_to_the_first_page(client, add_recipe):
+    add_recipe('Romanesco gratin', ['1 romanesco'])
+    # Past the last title of the catalog
+    response = client.get('/ricettario', query_string={'after': encode_cursor('\uffff', 10 ** 9)})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/ricettario')
+
+    assert client.get('/ricettario', query_string={'after': 'garbage'}).status_code == 200
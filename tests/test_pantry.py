@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import json
+
+from search_index import IngredientIndex
+
+
+def _build(rows):
+    index = IngredientIndex()
+    index.build([(recipe_id, vegetarian, json.dumps(ingredients), None)
+                 for recipe_id, vegetarian, ingredients in rows])
+    return index
+
+
+PANTRY_ROWS = [
+    (1, True, ['2 eggs', '1 cup milk']),
+    (2, True, ['2 eggs', '1 cup milk', '100 g flour']),
+    (3, False, ['2 eggs', '100 g bacon', '1 cup milk', '1 onion']),
+    (4, True, ['200 g egg noodles', '1 tbsp soy sauce']),
+    (5, True, ['1 tsp sea salt', '1 cup rice']),
+]
+
+
+def test_pantry_covers_every_ingredient():
+    matches = _build(PANTRY_ROWS).pantry(['eggs', 'milk'])
+    assert matches.ids.tolist() == [1]
+    assert matches.missing.tolist() == [0]
+
+
+def test_pantry_with_missing_ingredients_fewest_first():
+    index = _build(PANTRY_ROWS)
+    matches = index.pantry(['eggs', 'milk'], max_missing=2)
+    assert matches.ids.tolist() == [1, 2, 3]
+    assert matches.missing.tolist() == [0, 1, 2]
+    assert matches.missing_ingredients(3) == ['bacon', 'onion']
+    assert index.pantry(['eggs', 'milk'], max_missing=2, vegetarian_only=True).ids.tolist() == [1, 2]
+
+
+def test_pantry_items_cover_only_what_they_contain():
+    index = _build(PANTRY_ROWS)
+    # "eggs" is not "egg noodles"
+    assert 4 not in index.pantry(['eggs', 'soy sauce'], max_missing=0).ids.tolist()
+    assert index.pantry(['egg noodles', 'soy sauce']).ids.tolist() == [4]
+    # A plain "salt" does not cover "sea salt", but "sea salt" covers it
+    assert len(index.pantry(['salt', 'rice'])) == 0
+    assert index.pantry(['sea salt', 'rice']).ids.tolist() == [5]
+
+
+def test_api_pantry(client, add_recipe):
+    recipe = add_recipe('Barley water', ['100 g pearl barley', '1 tsp sumac'])
+    add_recipe('Barley stew', ['100 g pearl barley', '1 tsp sumac', '1 turnip'])
+
+    response = client.get('/api/pantry?ingredients=pearl barley,sumac')
+    assert response.status_code == 200
+    assert [r['id'] for r in response.get_json()] == [recipe['id']]
+    assert response.get_json()[0]['missing_count'] == 0
+
+    response = client.get('/api/pantry?ingredients=pearl barley,sumac&max_missing=1')
+    assert response.headers['X-Total-Count'] == '2'
+    assert response.get_json()[1]['missing_ingredients'] == ['turnip']
+
+    assert client.get('/api/pantry?ingredients=sumac&max_missing=99').status_code == 400
+    assert client.get('/api/pantry').status_code == 400
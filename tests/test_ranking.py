@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import app as recipe_app
+
+
+def test_favorites_rerank_the_cached_ranking(app, add_recipe, monkeypatch):
+    full = add_recipe('Okra stew', ['okra', 'sorrel'])
+    partial = add_recipe('Okra fry', ['okra', 'rice', 'garlic', 'cumin'])
+    terms = ['okra', 'sorrel']
+
+    with app.test_request_context():
+        total, plain = recipe_app.get_ranked_recipes(terms)
+        assert [r[0] for r in plain] == [full['id'], partial['id']]
+
+        calls = []
+        rank_recipes = recipe_app.rank_recipes
+        monkeypatch.setattr(recipe_app, 'rank_recipes', lambda *a, **k: calls.append(1) or rank_recipes(*a, **k))
+        favorites = {partial['id']}
+        _, boosted = recipe_app.get_ranked_recipes(terms, favorites=favorites)
+        assert calls == []
+
+        _, expected = rank_recipes(terms, favorites=favorites)
+    assert [(r[0], r[3]) for r in boosted] == [(r[0], r[3]) for r in expected]
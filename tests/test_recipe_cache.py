@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import json
+
+import app as recipe_app
+
+
+def test_updated_recipe_is_decoded_again_under_a_reused_hash(app):
+    with app.app_context():
+        recipe = recipe_app.Recipe(
+            title_en='Nettle risotto', ingredients_en=json.dumps(['nettles', 'rice']),
+            ingredients_it=json.dumps(['ortiche', 'riso']), instructions_en=json.dumps(['Stir.']),
+            content_hash='source-hash-b'
+        )
+        recipe_app.db.session.add(recipe)
+        recipe_app.db.session.commit()
+        assert recipe_app.recipe_cache.view(recipe).ingredients('it') == ('ortiche', 'riso')
+
+        # The importer writes the same source hash over different stored
+        # Italian fields, with bulk statements, and logs the change
+        with recipe_app.db.engine.begin() as connection:
+            connection.execute(
+                recipe_app.Recipe.__table__.update().where(recipe_app.Recipe.id == recipe.id)
+                .values(ingredients_it=json.dumps(['ortiche', 'riso carnaroli']))
+            )
+            recipe_app.record_catalog_changes(connection, [('update', recipe.id)])
+        recipe_app.sync_catalog(force=True)
+
+        recipe_app.db.session.expire_all()
+        recipe = recipe_app.Recipe.query.get(recipe.id)
+        assert recipe.content_hash == 'source-hash-b'
+        assert recipe_app.recipe_cache.view(recipe).ingredients('it') == ('ortiche', 'riso carnaroli')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pytest
+
+import recipe_stream
+from recipe_stream import (chunked, iter_json_array, iter_jsonl, normalize_recipe,
+                           prepare_recipe, read_recipes, set_known_recipes)
+
+RECIPES = [
+    {'title': 'Fennel salad', 'ingredients': ['1 fennel bulb', '1 orange'], 'instructions': 'Slice.\nToss.'},
+    {'title': 'Braised fennel', 'ingredients': '2 fennel bulbs, 1 cup stock', 'instructions': ['Braise.']},
+    {'title': 'Fennel gratin', 'ingredients': ['2 fennel bulbs'], 'instructions': ['Bake.'], 'vegan': True},
+]
+
+
+@pytest.fixture(autouse=True)
+def known_recipes(monkeypatch):
+    # set_known_recipes() is module state; keep it from leaking between tests
+    monkeypatch.setattr(recipe_stream, '_known_recipes', frozenset())
+
+
+@pytest.mark.parametrize('document', [
+    {'recipes': RECIPES, 'count': 3},
+    RECIPES,
+])
+def test_iter_json_array_reads_items_across_chunks(document):
+    text = json.dumps(document, indent=2)
+    # A chunk size smaller than one recipe makes every item span several reads
+    assert list(iter_json_array(io.StringIO(text), chunk_size=7)) == RECIPES
+
+
+def test_iter_json_array_empty_and_malformed():
+    assert list(iter_json_array(io.StringIO('{"recipes": []}'))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"count": 3}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"title": "Cut off"'), chunk_size=4))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"title": "Unclosed"}, '), chunk_size=4))
+
+
+def test_iter_jsonl_skips_blank_lines_and_reports_line_numbers():
+    text = json.dumps(RECIPES[0]) + '\n\n' + json.dumps(RECIPES[1]) + '\n'
+    assert list(iter_jsonl(io.StringIO(text))) == RECIPES[:2]
+    with pytest.raises(ValueError, match='line 4:'):
+        list(iter_jsonl(io.StringIO(text + '{"title": \n')))
+
+
+def test_read_recipes_picks_format_by_extension(tmp_path):
+    jsonl = tmp_path / 'recipes.jsonl'
+    jsonl.write_text(''.join(json.dumps(recipe) + '\n' for recipe in RECIPES), encoding='utf-8')
+    array = tmp_path / 'recipes.json'
+    array.write_text(json.dumps({'recipes': RECIPES}), encoding='utf-8')
+    assert list(read_recipes(str(jsonl))) == RECIPES
+    assert list(read_recipes(str(array), chunk_size=16)) == RECIPES
+
+
+def test_normalize_recipe():
+    values = normalize_recipe(RECIPES[1])
+    assert json.loads(values['ingredients_en']) == ['2 fennel bulbs', '1 cup stock']
+    assert json.loads(values['instructions_en']) == ['Braise.']
+    assert values['category'] == 'quick-meals'
+    assert normalize_recipe(RECIPES[0])['instructions_en'] == json.dumps(['Slice.', 'Toss.'])
+    # A vegan recipe is also vegetarian
+    assert normalize_recipe(RECIPES[2])['vegetarian'] is True
+    assert normalize_recipe({'title': 'No ingredients', 'instructions': ['Wait.']}) is None
+    assert normalize_recipe(['not', 'a', 'recipe']) is None
+
+
+def test_prepare_recipe_skips_parsing_known_recipes():
+    values, rows = prepare_recipe(RECIPES[0])
+    assert values['sort_key_en']
+    assert rows
+
+    set_known_recipes([(values['title_en'], values['content_hash'])])
+    assert prepare_recipe(RECIPES[0])[1] is None
+    # The same content under another title is still parsed
+    renamed = dict(RECIPES[0], title='Fennel and orange salad')
+    assert prepare_recipe(renamed)[1]
+    assert prepare_recipe({'title': 'Invalid'}) is None
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+def test_bulk_import_writes_ingredient_rows_and_skips_unchanged(app, tmp_path, capsys):
+    import app as recipe_app
+    from import_recipes import import_recipes
+
+    path = tmp_path / 'recipes.jsonl'
+    lines = [json.dumps(recipe) for recipe in RECIPES] + ['{"title": "Invalid"}']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    with app.app_context():
+        import_recipes(str(path), bulk=True, batch_size=2)
+        output = capsys.readouterr().out
+        assert 'Added 3 new recipes' in output
+        assert 'Skipped 1 recipes' in output
+
+        titles = [recipe['title'] for recipe in RECIPES]
+        recipes = recipe_app.Recipe.query.filter(recipe_app.Recipe.title_en.in_(titles)).all()
+        assert len(recipes) == len(titles)
+        for recipe in recipes:
+            assert recipe_app.RecipeIngredient.query.filter_by(recipe_id=recipe.id).count() > 0
+
+        import_recipes(str(path), bulk=True, batch_size=2)
+        output = capsys.readouterr().out
+        assert 'Added 0 new recipes' in output
+        assert 'Unchanged 3 recipes' in output
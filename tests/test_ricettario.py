@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import app as recipe_app
+
+
+@pytest.mark.parametrize('search, ingredient', [
+    ('tomatoes', '1 can peeled tomatoes'),
+    ('pepper', '1 tsp black pepper'),
+])
+def test_search_without_fulltext_matches_inside_ingredient_names(app, add_recipe, search, ingredient):
+    recipe = add_recipe('Plain rice', ['200 g rice', ingredient])
+
+    with app.test_request_context():
+        page = recipe_app.browse_catalog(search, None, 'en', per_page=50)
+
+    assert recipe['id'] in [row.id for row in page.items]
+
+
+def test_fulltext_cache_keeps_leading_hits_and_pages_past_them(app, add_recipe, monkeypatch):
+    if not recipe_app.fulltext.available:
+        pytest.skip('SQLite without FTS5')
+    ids = {add_recipe('Quinoa bowl {}'.format(n), ['1 cup quinoa'])['id'] for n in range(5)}
+    monkeypatch.setitem(app.config, 'SEARCH_CACHE_DEPTH', 2)
+
+    seen = []
+    after = None
+    with app.test_request_context():
+        while True:
+            page = recipe_app.search_catalog('quinoa', None, per_page=2, after=after)
+            assert page.total == 5
+            seen.extend(recipe.id for recipe in page.items)
+            if not page.next_cursor:
+                break
+            after = page.next_cursor
+        total, hits = recipe_app.search_cache.get(('ricettario-fts', 'quinoa'), recipe_app.catalog_state['version'])
+
+    assert sorted(seen) == sorted(ids)
+    assert (total, len(hits)) == (5, 2)
+
+
+def test_category_filter_shows_counts(app, client, add_recipe):
+    add_recipe('Semolina pudding', ['1 cup semolina'], category='desserts', vegetarian=True)
+    index = recipe_app.get_category_index()
+
+    page = client.get('/ricettario').get_data(as_text=True)
+
+    for category, count in (('desserts', index.count('desserts')), ('vegetarian', index.count('vegetarian'))):
+        link = page[page.index("category={}".format(category)):]
+        assert '>{}</span>'.format(count) in link[:link.index('</a>')]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import json
+
+from sqlalchemy import create_engine, text
+
+import app as recipe_app
+from schema import upgrade_schema
+
+
+def test_upgrade_fills_ingredient_rows_of_old_recipes(tmp_path):
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'old.db'))
+    recipe_app.db.Model.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # A recipe written before content hashes and parsed ingredients existed
+        connection.execute(text(
+            'INSERT INTO recipe (title_en, ingredients_en, instructions_en, vegetarian, vegan, category) '
+            "VALUES ('Old soup', :ingredients, '[\"Boil.\"]', 0, 0, 'soups')"
+        ), {'ingredients': json.dumps(['2 peeled tomatoes', '1 tsp black pepper'])})
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    with engine.connect() as connection:
+        names = [name for (name,) in connection.execute(text('SELECT name FROM recipe_ingredient ORDER BY position'))]
+        assert connection.execute(text('SELECT content_hash FROM recipe')).scalar()
+    assert names == ['peeled tomatoes', 'black pepper']
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from scoring import DEFAULT_WEIGHTS, RelevanceModel, inverse_document_frequency
+from search_index import IngredientIndex
+
+
+def test_fingerprint_depends_only_on_inputs():
+    first, second = RelevanceModel(), RelevanceModel()
+    first.refresh({3: 2, 1: 5})
+    first.refresh({1: 5, 3: 2})
+    second.refresh({1: 5, 3: 2})
+    assert first.fingerprint == second.fingerprint
+
+    second.refresh({1: 6, 3: 2})
+    assert first.fingerprint != second.fingerprint
+    assert RelevanceModel({'favorite': 0}).fingerprint != RelevanceModel().fingerprint
+
+
+def _index(rows):
+    index = IngredientIndex()
+    index.build([(recipe_id, False, json.dumps(ingredients), None) for recipe_id, ingredients in rows])
+    return index
+
+
+def _scores(index, terms, model=None, favorites=()):
+    model = model or RelevanceModel()
+    result = index.score(terms)
+    scores = model.score(index, terms, 'en', result, favorites)
+    return dict(zip(result.ids.tolist(), scores.total.tolist())), scores, result
+
+
+def test_rare_terms_weigh_more_than_staples():
+    index = _index([
+        (1, ['saffron', 'rice']),
+        (2, ['salt', 'rice']),
+        (3, ['salt', 'pepper']),
+        (4, ['salt', 'oil']),
+    ])
+    assert inverse_document_frequency(1, 4) > inverse_document_frequency(3, 4)
+    totals, scores, _ = _scores(index, ['salt', 'saffron'])
+    assert scores.term_weights['saffron'] > scores.term_weights['salt']
+    # Same coverage, one term each: saffron alone beats salt alone
+    assert totals[1] > totals[2] > 0
+
+
+def test_coverage_prefers_recipes_needing_little_else():
+    index = _index([(1, ['eggs', 'milk']), (2, ['eggs', 'milk', 'flour', 'sugar'])])
+    totals, scores, result = _scores(index, ['eggs', 'milk'])
+    assert totals[1] > totals[2]
+    assert scores.breakdown(result.ids.tolist().index(1))['coverage'] == 1.0
+
+
+def test_favorite_and_popularity_boosts():
+    index = _index([(1, ['eggs', 'ham']), (2, ['eggs', 'bacon'])])
+    totals, _, _ = _scores(index, ['eggs'])
+    assert totals[1] == totals[2]
+
+    boosted, _, _ = _scores(index, ['eggs'], favorites={2})
+    assert boosted[2] - boosted[1] == pytest.approx(DEFAULT_WEIGHTS['favorite'])
+
+    model = RelevanceModel()
+    model.refresh({1: 3})
+    popular, scores, result = _scores(index, ['eggs'], model)
+    assert popular[1] - popular[2] == pytest.approx(DEFAULT_WEIGHTS['popularity'])
+    assert scores.breakdown(result.ids.tolist().index(1))['popularity'] == 1.0
+
+
+def test_zero_weight_turns_a_component_off():
+    index = _index([(1, ['eggs', 'ham']), (2, ['eggs', 'bacon'])])
+    totals, _, _ = _scores(index, ['eggs'], RelevanceModel({'favorite': 0}), favorites={2})
+    assert totals[1] == totals[2]
+
+
+def test_explain_returns_score_breakdowns(client, add_recipe):
+    add_recipe('Kohlrabi slaw', ['1 kohlrabi', '1 carrot'])
+
+    results = client.get('/api/recipes?ingredients=kohlrabi&explain=true').get_json()
+
+    breakdown = results[0]['score_breakdown']
+    assert breakdown['score'] == results[0]['score']
+    assert set(breakdown) == {'score', 'match', 'coverage', 'favorite', 'popularity', 'term_weights'}
+    assert list(breakdown['term_weights']) == ['kohlrabi']
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import json
+
+import app as recipe_app
+import search_index
+from search_index import IngredientIndex
+
+
+def test_term_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(search_index, 'TERM_CACHE_SIZE', 3)
+    index = IngredientIndex()
+    index.build([(1, False, '["2 eggs", "1 cup milk"]', None)])
+    for n in range(10):
+        index.score(['egg', 'word{}'.format(n)])
+        index.pantry(['milk', 'word{}'.format(n)])
+    vocabulary = index._vocabularies['en']
+    assert len(vocabulary._aliases) == 3
+    assert len(vocabulary._pantry_columns) == 3
+    assert [key for key, _ in index.resolve('egg')] == ['eggs']
+
+
+def _build(rows):
+    index = IngredientIndex()
+    index.build([(recipe_id, vegetarian, json.dumps(en), json.dumps(it) if it else None)
+                 for recipe_id, vegetarian, en, it in rows])
+    return index
+
+
+def _matches(result):
+    return {recipe_id: row.tolist() for recipe_id, row in zip(result.ids.tolist(), result.matched)}
+
+
+def test_score_marks_the_terms_each_recipe_matches():
+    index = _build([
+        (1, False, ['2 eggs', '100 g pancetta'], None),
+        (2, True, ['3 eggs', '1 cup milk'], None),
+        (3, True, ['1 cup rice'], None),
+    ])
+    result = index.score(['eggs', 'milk'])
+    assert _matches(result) == {1: [True, False], 2: [True, True]}
+    assert result.counts.tolist() == [1, 2]
+    assert result.sizes.tolist() == [2, 2]
+    assert _matches(index.score(['eggs'], vegetarian_only=True)) == {2: [True]}
+
+
+def test_quantities_and_units_never_match():
+    index = _build([(1, False, ['350g flour', '2 tbsp oil'], None)])
+    assert len(index.score(['350g'])) == 0
+    assert len(index.score(['tbsp'])) == 0
+
+
+def test_italian_lists_fall_back_to_english():
+    index = _build([
+        (1, False, ['2 eggs'], ['2 uova']),
+        (2, False, ['1 cup milk'], None),
+    ])
+    assert _matches(index.score(['uova'], 'it')) == {1: [True]}
+    assert _matches(index.score(['milk'], 'it')) == {2: [True]}
+
+
+def test_add_remove_and_reindex():
+    index = _build([(1, False, ['2 eggs'], None)])
+    index.add(2, False, json.dumps(['1 leek']))
+    index.add(1, False, json.dumps(['1 leek', '1 potato']))
+    assert sorted(index.score(['leek']).ids.tolist()) == [1, 2]
+    assert len(index.score(['eggs'])) == 0
+
+    index.remove(2)
+    index.add(3, False, json.dumps(['1 leek']))
+    assert sorted(index.score(['leek']).ids.tolist()) == [1, 3]
+    assert len(index) == 2
+
+
+def test_vocabularies_wider_than_one_word_of_bits():
+    # Names made of letters only: digits are not part of ingredient words
+    names = ['herb' + chr(97 + n % 26) * (n // 26 + 1) for n in range(200)]
+    index = _build([(n, False, [name, 'water'], None) for n, name in enumerate(names)])
+    assert len(index.score(['water'])) == 200
+    assert index.score([names[-1]]).ids.tolist() == [199]
+
+
+def test_rank_recipes_orders_by_score_then_id(monkeypatch):
+    index = _build([
+        (10, False, ['eggs', 'milk'], None),
+        (11, False, ['eggs', 'milk'], None),
+        (12, False, ['eggs', 'flour', 'sugar', 'butter'], None),
+    ])
+    monkeypatch.setattr(recipe_app, 'get_ingredient_index', lambda: index)
+    total, ranked = recipe_app.rank_recipes(['eggs', 'milk'])
+    assert total == 3
+    assert [r[0] for r in ranked] == [10, 11, 12]
+    assert ranked[2][1:3] == (50.0, ['milk'])
+    # A limit keeps every recipe tied at the cut, then trims by id
+    assert [r[0] for r in recipe_app.rank_recipes(['eggs', 'milk'], limit=1)[1]] == [10]
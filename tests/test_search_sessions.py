@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import app as recipe_app
+
+
+def test_search_session_keeps_best_ids_and_notes_truncation(app, client, add_recipe, monkeypatch):
+    for title in ('Parsnip soup', 'Roast parsnips', 'Parsnip mash'):
+        add_recipe(title, ['3 parsnips', '1 celeriac'])
+    monkeypatch.setitem(app.config, 'SEARCH_SESSION_DEPTH', 2)
+
+    response = client.get('/api/recipes?ingredients=parsnip,celeriac&session=true')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 3
+
+    with app.app_context():
+        stored = recipe_app.SearchSession.query.get(body['token']).get_results()
+    assert stored['total'] == 3
+    assert all(len(result) == 2 for result in stored['ranked'])
+    assert len(stored['ranked']) == 2
+
+    page = client.get(body['results_url']).get_data(as_text=True)
+    assert 'Showing the best 2 of 3 matching recipes' in page
+    assert '100.0%' in page
@@ -2,6 +2,7 @@
 """
 This module contains translations for ingredients between English and Italian.
 """
+from phrase_matcher import PhraseMatcher
 
 # Unit translations
 UNIT_TRANSLATIONS = {
@@ -149,90 +150,35 @@ INGREDIENT_TRANSLATIONS = {
 # Create reverse translation dictionary (Italian to English)
 REVERSE_TRANSLATIONS = {v: k for k, v in INGREDIENT_TRANSLATIONS.items()}
 
+# Matchers built once at import: English phrase -> Italian, and any phrase -> English
+EN_TO_IT_MATCHER = PhraseMatcher(INGREDIENT_TRANSLATIONS.items())
+TO_EN_MATCHER = PhraseMatcher(
+    list(REVERSE_TRANSLATIONS.items()) + [(key, key) for key in INGREDIENT_TRANSLATIONS]
+)
+
 def translate_ingredient_with_quantity(ingredient_text, target_lang='en'):
     """
     Translate an ingredient with its quantity and unit to the target language.
     Example: "400ml coconut milk" -> "400ml latte di cocco"
     """
-    print(f"Translating ingredient with quantity: {ingredient_text} to {target_lang}")
-    
+    # Imported here because ingredient_parser builds its matcher from this module
+    from ingredient_parser import parse_ingredient, format_ingredient
+
     if not ingredient_text:
         return ingredient_text
-        
-    # Split the ingredient text into parts
-    parts = ingredient_text.split()
-    print(f"Parts: {parts}")
-    
-    # Try to find quantity and unit
-    quantity = None
-    unit = None
-    ingredient = []
-    
-    for part in parts:
-        # Check if part is a number or contains a number
-        if any(c.isdigit() for c in part):
-            quantity = part
-            print(f"Found quantity: {quantity}")
-        # Check if part is a unit
-        elif part.lower() in UNIT_TRANSLATIONS:
-            unit = part.lower()
-            print(f"Found unit: {unit}")
-        else:
-            ingredient.append(part)
-    
-    # Join the ingredient parts
-    ingredient_text = ' '.join(ingredient)
-    print(f"Looking for ingredient: {ingredient_text}")
-    
-    # Try to find the ingredient in the translations
-    translated_ingredient = None
-    for key in INGREDIENT_TRANSLATIONS:
-        if key.lower() in ingredient_text.lower():
-            print(f"Found matching key: {key}")
-            if target_lang == 'it':
-                translated_ingredient = INGREDIENT_TRANSLATIONS[key]
-            else:
-                translated_ingredient = key
-            break
-    
-    # If no translation found, use the original text
-    if translated_ingredient is None:
-        print("No translation found, using original")
-        translated_ingredient = ingredient_text
-    
-    # Reconstruct the string
-    result = []
-    if quantity:
-        result.append(quantity)
-    if unit:
-        if target_lang == 'it':
-            result.append(UNIT_TRANSLATIONS.get(unit, unit))
-        else:
-            result.append(unit)
-    result.append(translated_ingredient)
-    
-    final_result = ' '.join(result)
-    print(f"Final translation: {final_result}")
-    return final_result
+
+    return format_ingredient(parse_ingredient(ingredient_text), target_lang)
 
 def translate_ingredient(ingredient, target_lang='en'):
-    """Translate an ingredient to or from English"""
-    print(f"Translating ingredient: {ingredient} to {target_lang}")
-    
+    """
+    Translate an ingredient to or from English, using the longest dictionary
+    phrase found in it: "chicken breast fillet" -> "petto di pollo"
+    """
     if not ingredient:
         return ingredient
-        
+
     ingredient = ingredient.lower().strip()
-    
-    # Try to find the ingredient in the translations
-    for key in INGREDIENT_TRANSLATIONS:
-        if key.lower() in ingredient.lower():
-            print(f"Found matching key: {key}")
-            if target_lang == 'it':
-                return INGREDIENT_TRANSLATIONS[key]
-            else:
-                return key
-    
-    # If no translation found, return the original
-    print("No translation found, using original")
-    return ingredient 
\ No newline at end of file
+
+    if target_lang == 'it':
+        return EN_TO_IT_MATCHER.longest(ingredient) or ingredient
+    return TO_EN_MATCHER.longest(ingredient) or ingredient